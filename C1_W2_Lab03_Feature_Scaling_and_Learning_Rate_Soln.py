@@ -174,6 +174,61 @@ plot_cost_i_w(X_train,y_train,hist)
 
 # On the left, you see that cost is decreasing as it should. On the right you can see that $w_0$ is decreasing without crossing the minimum. Note above that `dj_w0` is negative throughout the run. This solution will also converge, though not quite as quickly as the previous example.
 
+# ### Finding $\alpha$ automatically
+# Each of the runs above is a full training run with a hand-picked $\alpha$. `find_learning_rate` in `lab_utils_train.py` automates the search with a *learning rate range test*:
+# - It tries learning rates on a log scale, starting from a tiny one, for 20 gradient steps each.
+# - A trial is abandoned as soon as the cost rises above its starting value. The sweep ends at the first $\alpha$ that diverges, so the very large rates are never run.
+# - The boundary between the largest stable and the smallest diverging $\alpha$ is then narrowed by a few bisections.
+# 
+# The whole search costs a few hundred gradient steps. The $\alpha$ it returns can be passed straight to `run_gradient_descent`.
+
+# In[ ]:
+
+
+from lab_utils_train import find_learning_rate, linear_cost_gradient, backtracking_gradient_descent
+
+alpha_best, trials = find_learning_rate(X_train, y_train, linear_cost_gradient)
+print(f"largest stable alpha: {alpha_best:0.2e}, found with {len(trials)} trials")
+_,_,hist = run_gradient_descent(X_train, y_train, 10, alpha = alpha_best)
+
+
+# Another way to avoid choosing $\alpha$ is a *backtracking line search*. At every iteration it starts from a large step and halves it until the cost drops by at least a small fraction of what the gradient predicts (the Armijo condition):
+# $$J(\mathbf{w} - \alpha \nabla J, b - \alpha \tfrac{\partial J}{\partial b}) \leq J(\mathbf{w},b) - c\,\alpha\,\|\nabla J\|^2$$
+# The step sizes it accepts settle close to the largest stable $\alpha$ found above.
+
+# In[ ]:
+
+
+_, _, hist_bt, alpha_hist = backtracking_gradient_descent(X_train, y_train, np.zeros(X_train.shape[1]), 0.,
+                                                          linear_cost_gradient, 10)
+
+
+# The runs with different values of $\alpha$ do not depend on each other, so they can also be run side by side on different CPU cores. `parallel_sweep` in `lab_utils_sweep.py` does this with a pool of worker processes that read the training data from shared memory, and `fit_gradient_descent` is a ready-made vectorized training run for it. The result is one table with a row per $\alpha$ that holds the final cost and the full cost history.
+
+# In[ ]:
+
+
+from lab_utils_sweep import parallel_sweep, fit_gradient_descent, format_table
+
+alphas = [1e-7, 3e-7, 9e-7, 9.9e-7, 1e-6]
+results = parallel_sweep(fit_gradient_descent, [{"alpha": a, "num_iters": 1000} for a in alphas],
+                         {"X": X_train, "y": y_train})
+print(format_table(results, ["alpha", "cost", "time"]))
+
+
+# Since every run uses the same `X_train`, the runs can also be trained together in a single process. `multi_gradient_descent` keeps one column of parameters per $\alpha$ and updates all of them with one matrix product per step. `J_sweep[:, p]` is the cost history of the run with `alphas[p]`.
+
+# In[ ]:
+
+
+from lab_utils_sweep import multi_gradient_descent
+
+with np.errstate(over='ignore', invalid='ignore'):
+    W_sweep, b_sweep, J_sweep = multi_gradient_descent(X_train, y_train, alphas, num_iters=1000)
+for p, alpha in enumerate(alphas):
+    print(f"alpha {alpha:0.1e}: cost after 10 iterations {J_sweep[9, p]:0.3e}, after 1000 {J_sweep[-1, p]:0.3e}")
+
+
 # ## Feature Scaling 
 # <figure>
 #     <img src="./images/C1_W2_Lab06_featurescalingheader.PNG" style="width:1200px;" >
@@ -392,6 +447,41 @@ x_house_predict = np.dot(x_house_norm, w_norm) + b_norm
 print(f" predicted price of a house with 1200 sqft, 3 bedrooms, 1 floor, 40 years old = ${x_house_predict*1000:0.0f}")
 
 
+# **Normalizing data that does not fit in memory**  
+# `zscore_normalize_features` needs all of `X` in memory. It makes one pass for the mean, a second for the standard deviation, and a third to build the normalized copy `X_norm`. For very large datasets, `ZScoreNormalizer` in `lab_utils_scaling.py` computes the same $\mu_j$ and $\sigma_j$ in a single pass over chunks of rows:
+# - `partial_fit` merges the statistics of each new chunk into the running ones. It keeps the count, the mean and the sum of squared deviations $M_2$. When a chunk $B$ is merged into the running statistics $A$, with $\delta = \mu_B - \mu_A$:
+# $$\mu = \mu_A + \delta \frac{m_B}{m_A + m_B} \qquad M_2 = M_{2,A} + M_{2,B} + \delta^2 \frac{m_A m_B}{m_A + m_B} \qquad \sigma = \sqrt{M_2 / m}$$
+# This is Welford's method, applied a chunk at a time. Unlike $\frac{1}{m}\sum x^2 - \mu^2$, it does not lose precision when the mean is large compared with the spread.
+# - `transform` can write into an existing array or normalize `X` in place, so no second copy of the data is needed.
+# - `save` and `load` store $\mu$ and $\sigma$, so the code that makes predictions later uses exactly the statistics of the training set.
+
+# In[ ]:
+
+
+import os
+import tempfile
+from lab_utils_scaling import ZScoreNormalizer
+
+# accumulate the statistics 20 rows at a time, as if X_train were read from disk in chunks
+scaler = ZScoreNormalizer()
+for start in range(0, X_train.shape[0], 20):
+    scaler.partial_fit(X_train[start:start + 20])
+print(f"mu    matches: {np.allclose(scaler.mu, X_mu)}, \nsigma matches: {np.allclose(scaler.sigma, X_sigma)}")
+
+# save the statistics with the model, then load them where predictions are made
+# (a temporary directory stands in for the model's directory)
+scaler_file = os.path.join(tempfile.mkdtemp(), "house_zscore.npz")
+scaler.save(scaler_file)
+serving_scaler = ZScoreNormalizer.load(scaler_file)
+x_house_norm = serving_scaler.transform(x_house)
+print(f" predicted price of a house with 1200 sqft, 3 bedrooms, 1 floor, 40 years old = ${(np.dot(x_house_norm, w_norm) + b_norm)*1000:0.0f}")
+
+# normalize a copy of the training data in place
+X_stream = X_train.astype(float)
+serving_scaler.transform(X_stream, inplace=True)
+print(f"in-place result matches X_norm: {np.allclose(X_stream, X_norm)}")
+
+
 # **Cost Contours**  
 # <img align="left" src="./images/C1_W2_Lab06_contours.PNG"   style="width:240px;" >Another way to view feature scaling is in terms of the cost contours. When feature scales do not match, the plot of cost versus parameters in a contour plot is asymmetric. 
 # 
@@ -17,6 +17,9 @@
 #   - [ 2.5 Gradient descent ](#2.5)
 #     - [ Exercise 2](#ex02)
 #   - [ 2.6 Learning parameters using batch gradient descent ](#2.6)
+#   - [ 2.7 Vectorized cost and gradient ](#2.7)
+#   - [ 2.8 Mini-batch gradient descent ](#2.8)
+#   - [ 2.9 Solving for w, b directly ](#2.9)
 # 
 
 # _**NOTE:** To prevent errors from the autograder, you are not allowed to edit or delete non-graded cells in this notebook . Please also refrain from adding any new cells. 
@@ -37,6 +40,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from utils import *
+from lab_utils_train import CostHistory, EarlyStopping, linear_cost_gradient
+from lab_utils_precision import floatx, accumulation, cast, cast_data
 import copy
 import math
 get_ipython().run_line_magic('matplotlib', 'inline')
@@ -595,7 +600,9 @@ print('Gradient at test w, b:', tmp_dj_dw, tmp_dj_db)
 # In[21]:
 
 
-def gradient_descent(x, y, w_in, b_in, cost_function, gradient_function, alpha, num_iters): 
+def gradient_descent(x, y, w_in, b_in, cost_function, gradient_function, alpha, num_iters, 
+                     cost_gradient_function=None, history_every=1, early_stopping=None,
+                     optimizer=None, history=None): 
     """
     Performs batch gradient descent to learn theta. Updates theta by taking 
     num_iters gradient steps with learning rate alpha
@@ -608,40 +615,89 @@ def gradient_descent(x, y, w_in, b_in, cost_function, gradient_function, alpha,
       gradient_function: function to compute the gradient
       alpha : (float) Learning rate
       num_iters : (int) number of iterations to run gradient descent
+      cost_gradient_function: optional function returning (cost, dj_dw, dj_db) from a single
+          pass over the data. When given, cost_function and gradient_function are not called
+          and J_history holds the cost before each update instead of after it
+      history_every : (int) save the cost in J_history every history_every iterations
+      early_stopping : optional EarlyStopping that ends the run before num_iters once the cost
+          or the gradient has flattened or the time budget is spent. The change in cost is
+          checked on the iterations where the cost is computed
+      optimizer : optional optimizer from lab_utils_train (Momentum, Nesterov, RMSProp, Adam)
+          that computes the update from the gradient and alpha. None is the plain update
+      history : optional HistoryRecorder from lab_utils_train. The costs and sampled copies of w
+          are recorded in its fixed-size buffers instead of J_history and w_history, which then
+          stay empty
     Returns
       w : (ndarray): Shape (1,) Updated values of parameters of the model after
           running gradient descent
       b : (scalar)                Updated value of parameter of the model after
           running gradient descent
+      J_history : (CostHistory) saved costs, with the reason training stopped in
+          J_history.stop_reason and the number of iterations run in J_history.num_iters
     """
     
     # number of training examples
     m = len(x)
     
+    x = cast_data(x)
+    
     # An array to store cost J and w's at each iteration — primarily for graphing later
-    J_history = []
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    J_history.num_iters = num_iters
     w_history = []
     w = copy.deepcopy(w_in)  #avoid modifying global w within function
     b = b_in
     
+    # The optimizers update w in place, as an array in the floatx dtype
+    if optimizer is not None:
+        w = cast(w).copy()
+        optimizer.start(w, b)
+    
+    if early_stopping is not None:
+        early_stopping.start()
+
     for i in range(num_iters):
+        cost = None
+        save_cost = i % history_every == 0
+        print_cost = i % math.ceil(num_iters/10) == 0
 
         # Calculate the gradient and update the parameters
-        dj_dw, dj_db = gradient_function(x, y, w, b )  
+        if cost_gradient_function is not None:
+            # cost and gradient share the same pass over the data
+            cost, dj_dw, dj_db = cost_gradient_function(x, y, w, b)
+        else:
+            dj_dw, dj_db = gradient_function(x, y, w, b )  
 
         # Update Parameters using w, b, alpha and gradient
-        w = w - alpha * dj_dw               
-        b = b - alpha * dj_db               
-
-        # Save cost J at each iteration
-        if i<100000:      # prevent resource exhaustion 
+        if optimizer is None:
+            w = w - alpha * dj_dw               
+            b = b - alpha * dj_db               
+        else:
+            w, b = optimizer.step(w, b, dj_dw, dj_db, alpha)
+
+        # Only pay for a second pass when the cost is actually needed
+        if cost_gradient_function is None and (save_cost or print_cost):
             cost =  cost_function(x, y, w, b)
+
+        # Save cost J every history_every iterations
+        if history is not None:
+            history.record(i, cost, w)
+        elif save_cost and len(J_history) < 100000:      # prevent resource exhaustion 
             J_history.append(cost)
 
         # Print cost every at intervals 10 times or as many iterations if < 10
-        if i% math.ceil(num_iters/10) == 0:
-            w_history.append(w)
-            print(f"Iteration {i:4}: Cost {float(J_history[-1]):8.2f}   ")
+        if print_cost:
+            if history is None:
+                w_history.append(w if optimizer is None else w.copy())
+            print(f"Iteration {i:4}: Cost {float(cost):8.2f}   ")
+
+        # Stop once converged or out of time
+        if early_stopping is not None and early_stopping.update(cost, dj_dw, dj_db):
+            J_history.stop_reason = early_stopping.stop_reason
+            J_history.num_iters = i + 1
+            print(f"Iteration {i:4}: stopped early ({J_history.stop_reason})")
+            break
         
     return w, b, J_history, w_history #return w and J,w history for graphing
 
@@ -739,6 +795,212 @@ print('For population = 70,000, we predict a profit of $%.2f' % (predict2*10000)
 #   </tr>
 # </table>
 
+# <a name="2.7"></a>
+# ### 2.7 Vectorized cost and gradient
+# 
+# The `compute_cost` and `compute_gradient` functions above loop over every example in Python. That is fine for 97 cities, but each of the 1500 iterations of gradient descent visits every example twice, so the run time grows quickly with $m$.
+# 
+# Both functions share the same residual $f_{w,b}(x^{(i)}) - y^{(i)}$, so we can compute it once for all examples with NumPy and derive the cost and the gradient from it:
+# 
+# $$J(\mathbf{w},b) = \frac{1}{2m} (\mathbf{X}\mathbf{w} + b - \mathbf{y})^T(\mathbf{X}\mathbf{w} + b - \mathbf{y})$$
+# $$\frac{\partial J(\mathbf{w},b)}{\partial \mathbf{w}} = \frac{1}{m} \mathbf{X}^T(\mathbf{X}\mathbf{w} + b - \mathbf{y}) \qquad \frac{\partial J(\mathbf{w},b)}{\partial b} = \frac{1}{m} \sum\limits_{i = 0}^{m-1} (f_{\mathbf{w},b}(\mathbf{x}^{(i)}) - y^{(i)})$$
+# 
+# - `compute_cost_gradient` accepts `x` of shape (m,) with a scalar `w`, as above, or a multi-feature `x` of shape (m,n) with `w` of shape (n,).
+# - `batch_size` optionally splits the examples into row blocks so the temporaries stay small for very large $m$.
+# - The arithmetic is done in the dtype set with `set_floatx` from `lab_utils_precision.py`, float64 unless you change it. With `set_floatx('float32')` the data is read at half the memory bandwidth, while the sums over blocks are still carried in the accumulation dtype, float64 by default.
+# - `compute_cost_v` and `compute_gradient_v` have the same signatures as the loop versions, so they can be passed to `gradient_descent` directly.
+# 
+# `linear_cost_gradient` in `lab_utils_train.py` is a library copy of the same computation, for (m,n) data, with a regularization term and the `(cost, dj_db, dj_dw)` order of the logistic regression lab. The solvers, sweeps and mini-batch loops in the `lab_utils_*.py` modules use it because a module cannot import functions from a notebook. The version here returns this lab's `(cost, dj_dw, dj_db)` order and takes a single-feature `x`. The check below compares the two.
+
+# In[ ]:
+
+
+def compute_cost_gradient(x, y, w, b, batch_size=None):
+    """
+    Computes the cost and the gradient for linear regression in one vectorized pass
+    Args:
+      x (ndarray): Shape (m,) or (m,n) Input to the model
+      y (ndarray): Shape (m,) Label
+      w (scalar or ndarray Shape (n,)): Parameters of the model
+      b (scalar): Parameter of the model
+      batch_size (int): Optional number of rows processed per block. None processes all rows at once
+    Returns
+      total_cost (float): The cost of using w,b as the parameters for linear regression
+      dj_dw (scalar or ndarray Shape (n,)): The gradient of the cost w.r.t. the parameters w
+      dj_db (scalar): The gradient of the cost w.r.t. the parameter b
+    """
+    m = x.shape[0]
+    if batch_size is None:
+        batch_size = m
+
+    # x keeps its float dtype and is not copied, w and b are cast to it. The sums over
+    # the blocks are carried in the accumulation dtype and returned in floatx
+    dtype, acc = floatx(), accumulation()
+    x = cast_data(x)
+    w, b = cast(w, x.dtype), cast(b, x.dtype)
+    cost_sum = acc.type(0)
+    dj_dw = acc.type(0) if x.ndim == 1 else np.zeros(x.shape[1], dtype=acc)
+    dj_db = acc.type(0)
+
+    for start in range(0, m, batch_size):
+        x_b = x[start:start + batch_size]
+        f_wb = x_b @ w + b if x.ndim > 1 else w * x_b + b
+        err = f_wb - cast(y[start:start + batch_size], x.dtype)   # shared residual
+        cost_sum += np.sum(np.square(err), dtype=acc)
+        dj_dw += x_b.T @ err if x.ndim > 1 else np.sum(x_b * err, dtype=acc)
+        dj_db += np.sum(err, dtype=acc)
+
+    return dtype.type(cost_sum / (2 * m)), (dj_dw / m).astype(dtype), dtype.type(dj_db / m)
+
+
+def compute_cost_v(x, y, w, b):
+    """ Vectorized drop-in replacement for compute_cost """
+    return compute_cost_gradient(x, y, w, b)[0]
+
+
+def compute_gradient_v(x, y, w, b):
+    """ Vectorized drop-in replacement for compute_gradient """
+    _, dj_dw, dj_db = compute_cost_gradient(x, y, w, b)
+    return dj_dw, dj_db
+
+
+# Check that the vectorized versions agree with the loop versions on the dataset.
+
+# In[ ]:
+
+
+cost_v, dj_dw_v, dj_db_v = compute_cost_gradient(x_train, y_train, 0.2, 0.2)
+print(f'Cost at test w,b: loop {compute_cost(x_train, y_train, 0.2, 0.2):.6f}, vectorized {cost_v:.6f}')
+print('Gradient at test w,b: loop', compute_gradient(x_train, y_train, 0.2, 0.2), 'vectorized', (dj_dw_v, dj_db_v))
+cost_l, dj_db_l, dj_dw_l = linear_cost_gradient(x_train.reshape(-1, 1), y_train, np.array([0.2]), 0.2)
+print('matches lab_utils_train.linear_cost_gradient:',
+      np.allclose([cost_v, dj_dw_v, dj_db_v], [cost_l, dj_dw_l[0], dj_db_l]))
+
+w_v,b_v,_,_ = gradient_descent(x_train ,y_train, 0., 0.,
+                     compute_cost_v, compute_gradient_v, alpha, iterations)
+print("w,b found by gradient descent:", w_v, b_v)
+
+
+# `gradient_descent` can also take the fused function directly through `cost_gradient_function`. It then makes a single pass over the data per iteration instead of two, because the cost comes out of the same pass as the gradient. `history_every` controls how often the cost is saved in `J_history`.
+
+# In[ ]:
+
+
+w_f,b_f,J_hist_f,_ = gradient_descent(x_train ,y_train, 0., 0., None, None, alpha, iterations,
+                     cost_gradient_function=compute_cost_gradient, history_every=10)
+print("w,b found by gradient descent:", w_f, b_f)
+print("Number of saved costs:", len(J_hist_f))
+
+
+# The 1500 iterations above are more than this problem needs: the cost stops changing well before the end. An `EarlyStopping` object from `lab_utils_train.py` ends the run once the relative change in cost stays below `tol` for `patience` iterations in a row, once the norm of the gradient is below `gtol`, or once `max_time` seconds have passed. The reason is saved in `J_history.stop_reason`.
+
+# In[ ]:
+
+
+early_stopping = EarlyStopping(tol=1e-9, gtol=1e-4, patience=10, max_time=60)
+w_es,b_es,J_hist_es,_ = gradient_descent(x_train ,y_train, 0., 0., None, None, alpha, 100000,
+                     cost_gradient_function=compute_cost_gradient, early_stopping=early_stopping)
+print("w,b found by gradient descent:", w_es, b_es)
+print(f"Stopped after {J_hist_es.num_iters} iterations ({J_hist_es.stop_reason})")
+
+
+# `gradient_descent` can also take an `optimizer` from `lab_utils_train.py` in place of the plain update $w = w - \alpha \frac{\partial J}{\partial w}$. `Momentum` and `Nesterov` add a running velocity to the step, `RMSProp` scales the step of each parameter by the size of its recent gradients, and `Adam` does both. With the same stopping criteria, they converge in far fewer iterations than the plain update.
+
+# In[ ]:
+
+
+from lab_utils_train import Momentum, Nesterov, RMSProp, Adam
+
+for name, optimizer, alpha_opt in [("plain", None, 0.01), ("Momentum", Momentum(), 0.01), ("Nesterov", Nesterov(), 0.01),
+                                   ("RMSProp", RMSProp(), 0.01), ("Adam", Adam(), 0.1)]:
+    early_stopping = EarlyStopping(tol=1e-9, gtol=1e-4, patience=10, max_time=60)
+    w_opt,b_opt,J_hist_opt,_ = gradient_descent(x_train ,y_train, 0., 0., None, None, alpha_opt, 100000,
+                         cost_gradient_function=compute_cost_gradient, early_stopping=early_stopping,
+                         optimizer=optimizer)
+    print(f"{name}: {J_hist_opt.num_iters} iterations ({J_hist_opt.stop_reason}), w = {float(w_opt):0.4f}, b = {float(b_opt):0.4f}")
+
+
+# Now let's compare the run time of the two versions as the number of examples grows. The loop versions take several seconds per call at $10^6$ rows and above, so this cell takes a few minutes to run.
+
+# In[ ]:
+
+
+import time
+
+def time_call(func, *args):
+    """ Returns the result of func(*args) and the elapsed wall-clock time in seconds """
+    tic = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - tic
+
+rng = np.random.default_rng(1)
+print(f"{'m':>10} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8} {'max abs diff':>13}")
+for m_bench in [10**3, 10**4, 10**5, 10**6, 10**7]:
+    x_bench = rng.uniform(5, 25, m_bench)
+    y_bench = 1.2 * x_bench - 4 + rng.normal(0, 3, m_bench)
+
+    (cost_l, (dj_dw_l, dj_db_l)), t_loop = time_call(
+        lambda: (compute_cost(x_bench, y_bench, 0.2, 0.2), compute_gradient(x_bench, y_bench, 0.2, 0.2)))
+    (cost_v, dj_dw_v, dj_db_v), t_vec = time_call(
+        compute_cost_gradient, x_bench, y_bench, 0.2, 0.2, 10**6)
+
+    max_diff = np.max(np.abs(np.array([cost_l - cost_v, dj_dw_l - dj_dw_v, dj_db_l - dj_db_v])))
+    print(f"{m_bench:>10} {t_loop:>10.4f} {t_vec:>15.5f} {t_loop / t_vec:>8.0f} {max_diff:>13.2e}")
+
+# <a name="2.8"></a>
+# ### 2.8 Mini-batch gradient descent
+# 
+# Batch gradient descent needs the whole of `x_train` in memory and only updates $(w,b)$ once per pass over the data. When the training set is too large for memory, we can instead update the parameters after every small batch of examples and read the batches from disk as we go. This is **mini-batch gradient descent**; with a batch size of 1 it is called stochastic gradient descent (SGD).
+# 
+# `lab_utils_train.py` contains a mini-batch loop that works for both linear and logistic regression:
+# - `npy_batches` memory-maps `.npy` files so only one batch at a time is read from disk. `array_batches` does the same for arrays in memory, and `generator_batches` regroups chunks coming from any generator.
+# - Batches are reshuffled every epoch (one pass over the data).
+# - `alpha` can be a number or a learning rate schedule such as `inverse_time_decay`, which shrinks the steps as training goes on so the noisy mini-batch updates settle down.
+# 
+# Below, we write the dataset to `.npy` files in a temporary directory and train from the files. The loop expects `X` with shape (m,n), so the population is reshaped into a single-column matrix.
+
+# In[ ]:
+
+
+import os
+import tempfile
+from lab_utils_train import npy_batches, linear_cost_gradient, inverse_time_decay, minibatch_gradient_descent
+
+data_dir = tempfile.mkdtemp()
+x_file, y_file = os.path.join(data_dir, "x_train.npy"), os.path.join(data_dir, "y_train.npy")
+np.save(x_file, x_train.reshape(-1, 1))
+np.save(y_file, y_train)
+
+batches = npy_batches(x_file, y_file, batch_size=16, seed=1)
+w_sgd, b_sgd, J_hist_sgd = minibatch_gradient_descent(batches, np.zeros(1), 0., linear_cost_gradient,
+                                                      inverse_time_decay(0.01, 1e-3), num_epochs=300)
+print("w,b found by mini-batch gradient descent:", w_sgd, b_sgd)
+
+
+# <a name="2.9"></a>
+# ### 2.9 Solving for w, b directly
+# 
+# For linear regression, the parameters that minimize the cost can also be computed directly. Setting the gradient to zero gives the *normal equations*
+# $$\begin{bmatrix}\mathbf{X}^T\mathbf{X} + \lambda I & \mathbf{X}^T\mathbf{1} \\ \mathbf{1}^T\mathbf{X} & m\end{bmatrix} \begin{bmatrix}\mathbf{w} \\ b\end{bmatrix} = \begin{bmatrix}\mathbf{X}^T\mathbf{y} \\ \mathbf{1}^T\mathbf{y}\end{bmatrix}$$
+# which is a small $(n+1) \times (n+1)$ system. It can be solved with a Cholesky factorization, and $\lambda$ adds optional ridge regularization. When $n$ is small this is much faster than thousands of gradient steps. 
+# 
+# `fit` in `lab_utils_solvers.py` selects the method with `solver`: `"gd"` (gradient descent until the gradient norm is below `tol`), `"normal"`, `"newton"` or `"lbfgs"`. The cell below compares the time each one takes to reach the same answer.
+
+# In[ ]:
+
+
+from lab_utils_solvers import fit
+
+X_col = x_train.reshape(-1, 1)
+for solver in ["gd", "normal", "newton", "lbfgs"]:
+    tic = time.perf_counter()
+    w_s, b_s, J_hist_s = fit(X_col, y_train, model="linear", solver=solver, alpha=0.01,
+                             num_iters=100000, tol=1e-6)
+    toc = time.perf_counter()
+    print(f"{solver:>7}: w = {w_s[0]:.6f}, b = {b_s:.6f}, {J_hist_s.num_iters:6} iterations, "
+          f"{(toc - tic) * 1000:8.2f} ms ({J_hist_s.stop_reason})")
+
+
 # **Congratulations on completing this practice lab on linear regression! Next week, you will create models to solve a different type of problem: classification. See you there!**
 
 # <details>
@@ -26,6 +26,21 @@
 #   - [ 3.6 Learning parameters using gradient descent](#3.6)
 #   - [ 3.7 Plotting the decision boundary](#3.7)
 #   - [ 3.8 Evaluating regularized logistic regression model](#3.8)
+# - [ 4 - Faster training](#4)
+#   - [ 4.1 Fused cost and gradient](#4.1)
+#   - [ 4.2 Mini-batch gradient descent](#4.2)
+#   - [ 4.3 Stopping early](#4.3)
+#   - [ 4.4 Second-order solvers](#4.4)
+#   - [ 4.5 A numerically stable cost](#4.5)
+#   - [ 4.6 Reusing the gradient buffer](#4.6)
+#   - [ 4.7 Scoring large datasets](#4.7)
+#   - [ 4.8 More than two classes](#4.8)
+#   - [ 4.9 Polynomial features on the fly](#4.9)
+#   - [ 4.10 Sweeping $\lambda$ in parallel](#4.10)
+#   - [ 4.11 Sparse features](#4.11)
+#   - [ 4.12 Checkpoints](#4.12)
+#   - [ 4.13 Momentum, RMSProp and Adam](#4.13)
+#   - [ 4.14 A training log of fixed size](#4.14)
 # 
 
 # _**NOTE:** To prevent errors from the autograder, you are not allowed to edit or delete non-graded cells in this lab. Please also refrain from adding any new cells. 
@@ -45,6 +60,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from utils import *
+from lab_utils_train import CostHistory, EarlyStopping, Checkpoint, HistoryRecorder, logistic_cost_gradient
+from lab_utils_precision import cast, cast_data, reduce_sum, reduce_mean, precision
+from lab_utils_sparse import issparse, rmatvec
 import copy
 import math
 
@@ -305,7 +323,7 @@ def compute_cost(X, y, w, b, lambda_= 1):
     """
     Computes the cost over all examples
     Args:
-      X : (ndarray Shape (m,n)) data, m examples by n features
+      X : (ndarray or scipy.sparse Shape (m,n)) data, m examples by n features
       y : (array_like Shape (m,)) target value 
       w : (array_like Shape (n,)) Values of parameters of the model      
       b : scalar Values of bias parameter of the model
@@ -318,24 +336,17 @@ def compute_cost(X, y, w, b, lambda_= 1):
     
     ### START CODE HERE ###
     
-    loss_sum = 0
+    # X keeps its float dtype and is not copied; y, w and b are cast to it
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    z_wb = X @ w + b
     
-    for i in range(m):
-        
-        z_wb = 0
-        
-        for j in range(n):
-        
-            z_wb_ij = w[j]*X[i][j]
-            z_wb += z_wb_ij
-        
-        z_wb += b
-        
-        f_wb = sigmoid(z_wb)
-        loss = -y[i] * np.log(f_wb) - (1 - y[i]) * np.log(1 - f_wb)
-        loss_sum += loss
+    # -y*log(g(z)) - (1-y)*log(1-g(z)) simplifies to log(1+e^z) - y*z.
+    # np.logaddexp(0, z) evaluates log(1+e^z) without overflow, so the
+    # loss stays finite however large |z| is
+    loss = np.logaddexp(0, z_wb) - y * z_wb
     
-    total_cost = (1 / m) * loss_sum
+    total_cost = (1 / m) * reduce_sum(loss)
     
     ### END CODE HERE ### 
 
@@ -508,7 +519,7 @@ def compute_gradient(X, y, w, b, lambda_=None):
     Computes the gradient for logistic regression 
  
     Args:
-      X : (ndarray Shape (m,n)) variable such as house size 
+      X : (ndarray or scipy.sparse Shape (m,n)) variable such as house size 
       y : (array_like Shape (m,1)) actual value 
       w : (array_like Shape (n,1)) values of parameters of the model      
       b : (scalar)                 value of parameter of the model 
@@ -518,32 +529,17 @@ def compute_gradient(X, y, w, b, lambda_=None):
       dj_db: (scalar)                The gradient of the cost w.r.t. the parameter b. 
     """
     m, n = X.shape
-    dj_dw = np.zeros(w.shape)
-    dj_db = 0.
  
     ### START CODE HERE ### 
-    for i in range(m):
-        
-        z_wb = 0
-                 
-        for j in range(n): 
-                     
-            z_wb_ij = w[j]*X[i][j]
-            z_wb += z_wb_ij
-             
-        z_wb += b
-            
-        f_wb = sigmoid(z_wb)
-        
-        dj_db_i = f_wb - y[i]
-        dj_db += dj_db_i
-        
-        for j in range(n): 
-           
-            dj_dw_ij = (f_wb - y[i])* X[i][j]
-            dj_dw[j] += dj_dw_ij
+    # One matrix-vector product covers all the examples. It also works for a
+    # scipy.sparse X, where its cost is proportional to the number of nonzeros
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    err = sigmoid(X @ w + b) - y
+    dj_db = reduce_sum(err)
+    dj_dw = rmatvec(X, err)
             
-    dj_dw = dj_dw / m
+    dj_dw = cast(dj_dw) / m
     dj_db = dj_db / m
     ### END CODE HERE ###
         
@@ -691,7 +687,9 @@ compute_gradient_test(compute_gradient)
 # In[85]:
 
 
-def gradient_descent(X, y, w_in, b_in, cost_function, gradient_function, alpha, num_iters, lambda_): 
+def gradient_descent(X, y, w_in, b_in, cost_function, gradient_function, alpha, num_iters, lambda_, 
+                     cost_gradient_function=None, history_every=1, early_stopping=None,
+                     checkpoint=None, optimizer=None, history=None): 
     """
     Performs batch gradient descent to learn theta. Updates theta by taking 
     num_iters gradient steps with learning rate alpha
@@ -705,39 +703,114 @@ def gradient_descent(X, y, w_in, b_in, cost_function, gradient_function, alpha,
       alpha : (float)                 Learning rate
       num_iters : (int)               number of iterations to run gradient descent
       lambda_ (scalar, float)         regularization constant
+      cost_gradient_function:         optional function returning (cost, dj_db, dj_dw) from a
+                                      single pass over the data. When given, cost_function and
+                                      gradient_function are not called and J_history holds the
+                                      cost before each update instead of after it
+      history_every : (int)           save the cost in J_history every history_every iterations
+      early_stopping:                 optional EarlyStopping that ends the run before num_iters
+                                      once the cost or the gradient has flattened or the time
+                                      budget is spent. The change in cost is checked on the
+                                      iterations where the cost is computed
+      checkpoint:                     optional Checkpoint. The iteration count, w, b and
+                                      J_history are saved to its file periodically, at the
+                                      end and when stopping early. If the file exists, the
+                                      run resumes from it instead of from w_in, b_in
+      optimizer:                      optional optimizer from lab_utils_train (Momentum,
+                                      Nesterov, RMSProp, Adam) that computes the update
+                                      from the gradient and alpha. Its state is saved
+                                      in the checkpoint. None is the plain update
+      history:                        optional HistoryRecorder. The costs and sampled copies
+                                      of w are recorded in its fixed-size buffers instead
+                                      of J_history and w_history, which then stay empty
       
     Returns:
       w : (array_like Shape (n,)) Updated values of parameters of the model after
           running gradient descent
       b : (scalar)                Updated value of parameter of the model after
           running gradient descent
+      J_history : (CostHistory)   saved costs, with the reason training stopped in
+                                  J_history.stop_reason and the number of iterations run
+                                  in J_history.num_iters
     """
     
     # number of training examples
-    m = len(X)
+    m = X.shape[0]
+    
+    X = cast_data(X)
     
     # An array to store cost J and w's at each iteration primarily for graphing later
-    J_history = []
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    J_history.num_iters = num_iters
     w_history = []
     
-    for i in range(num_iters):
+    # Continue an interrupted run from its last checkpoint
+    start = 0
+    saved = checkpoint.load() if checkpoint is not None else None
+    if saved is not None:
+        start, w_in, b_in = saved["iteration"], saved["w"], saved["b"]
+        J_history.extend(saved["J_history"])
+        print(f"Resuming from iteration {start}")
+    
+    # The optimizers update w in place, so work on a copy of it
+    if optimizer is not None:
+        w_in = cast(w_in).copy()
+        optimizer.start(w_in, b_in)
+        if saved is not None:
+            optimizer.load_state(saved["state"])
+    
+    if early_stopping is not None:
+        early_stopping.start()
+
+    for i in range(start, num_iters):
+        cost = None
+        save_cost = i % history_every == 0
+        print_cost = i % math.ceil(num_iters/10) == 0 or i == (num_iters-1)
 
         # Calculate the gradient and update the parameters
-        dj_db, dj_dw = gradient_function(X, y, w_in, b_in, lambda_)   
+        if cost_gradient_function is not None:
+            # cost and gradient share the same pass over the data
+            cost, dj_db, dj_dw = cost_gradient_function(X, y, w_in, b_in, lambda_)
+        else:
+            dj_db, dj_dw = gradient_function(X, y, w_in, b_in, lambda_)   
 
         # Update Parameters using w, b, alpha and gradient
-        w_in = w_in - alpha * dj_dw               
-        b_in = b_in - alpha * dj_db              
+        if optimizer is None:
+            w_in = w_in - alpha * dj_dw               
+            b_in = b_in - alpha * dj_db              
+        else:
+            w_in, b_in = optimizer.step(w_in, b_in, dj_dw, dj_db, alpha)
        
-        # Save cost J at each iteration
-        if i<100000:      # prevent resource exhaustion 
+        # Only pay for a second pass when the cost is actually needed
+        if cost_gradient_function is None and (save_cost or print_cost):
             cost =  cost_function(X, y, w_in, b_in, lambda_)
+
+        # Save cost J every history_every iterations
+        if history is not None:
+            history.record(i, cost, w_in)
+        elif save_cost and len(J_history) < 100000:      # prevent resource exhaustion 
             J_history.append(cost)
 
         # Print cost every at intervals 10 times or as many iterations if < 10
-        if i% math.ceil(num_iters/10) == 0 or i == (num_iters-1):
-            w_history.append(w_in)
-            print(f"Iteration {i:4}: Cost {float(J_history[-1]):8.2f}   ")
+        if print_cost:
+            if history is None:
+                w_history.append(w_in if optimizer is None else w_in.copy())
+            print(f"Iteration {i:4}: Cost {float(cost):8.2f}   ")
+
+        # Stop once converged or out of time
+        stop = early_stopping is not None and early_stopping.update(cost, dj_dw, dj_db)
+
+        # Save the training state so the run can be resumed
+        if checkpoint is not None and (checkpoint.due(i) or stop or i == num_iters - 1):
+            checkpoint.save(i + 1, w_in, b_in, J_history,
+                            optimizer.state() if optimizer is not None else None)
+
+        if stop:
+            J_history.stop_reason = early_stopping.stop_reason
+            J_history.num_iters = i + 1
+            print(f"Iteration {i:4}: stopped early ({J_history.stop_reason})")
+            break
         
     return w_in, b_in, J_history, w_history #return w and J,w history for graphing
 
@@ -834,42 +907,46 @@ plot_decision_boundary(w, b, X_train, y_train)
 # UNQ_C4
 # GRADED FUNCTION: predict
 
-def predict(X, w, b): 
+def predict(X, w, b, threshold=0.5, chunk_size=65536, out=None): 
     """
     Predict whether the label is 0 or 1 using learned logistic
     regression parameters w
     
     Args:
-    X : (ndarray Shape (m, n))
+    X : (ndarray or scipy.sparse Shape (m, n))
     w : (array_like Shape (n,))      Parameters of the model
     b : (scalar, float)              Parameter of the model
+    threshold : (scalar, float)      Probability at or above which the label is 1, strictly
+                                     between 0 and 1
+    chunk_size : (int)               Number of rows scored at a time, which bounds the
+                                     memory used for temporaries
+    out : (ndarray Shape (m,))       Optional array the predictions are written into
 
     Returns:
     p: (ndarray (m,1))
-        The predictions for X using a threshold at 0.5
+        The predictions for X using the threshold, 0.5 by default
     """
     # number of training examples
     m, n = X.shape   
-    p = np.zeros(m)
+    p = np.zeros(m) if out is None else out
+    # the label is 1 where the exact probability is >= threshold. At 0 and 1 the
+    # comparison on z below needs an infinite z_threshold, and would disagree with a
+    # sigmoid that rounds to 0.0 or 1.0 in floating point, so those are rejected
+    if not 0 < threshold < 1:
+        raise ValueError(f"threshold must be strictly between 0 and 1, got {threshold}")
    
     ### START CODE HERE ### 
-    # Loop over each example
-    for i in range(m):   
-        z_wb = 0
-        # Loop over each feature
-        for j in range(n): 
-            # Add the corresponding term to z_wb
-            z_wb_ij = w[j]*X[i][j]
-            z_wb += z_wb_ij
-        
-        # Add bias term 
-        z_wb += b
-        
-        # Calculate the prediction for this example
-        f_wb = sigmoid(z_wb)
-
-        # Apply the threshold
-        p[i] = f_wb >= 0.5
+    # sigmoid(z) >= threshold is the same as z >= log(threshold / (1 - threshold)),
+    # so the threshold is applied to z and the sigmoid is never evaluated
+    z_threshold = np.log(threshold) - np.log1p(-threshold)
+    
+    # Score the examples one block of rows at a time. A sparse CSC matrix
+    # cannot be sliced by rows cheaply, so it is scored in a single block
+    if issparse(X) and X.format == "csc":
+        chunk_size = max(m, 1)
+    for start in range(0, m, chunk_size):
+        z_wb = X[start:start + chunk_size] @ w + b
+        p[start:start + chunk_size] = z_wb >= z_threshold
         
     ### END CODE HERE ### 
     return p
@@ -1139,7 +1216,7 @@ def compute_cost_reg(X, y, w, b, lambda_ = 1):
     """
     Computes the cost over all examples
     Args:
-      X : (array_like Shape (m,n)) data, m examples by n features
+      X : (array_like or scipy.sparse Shape (m,n)) data, m examples by n features
       y : (array_like Shape (m,)) target value 
       w : (array_like Shape (n,)) Values of parameters of the model      
       b : (array_like Shape (n,)) Values of bias parameter of the model
@@ -1157,11 +1234,8 @@ def compute_cost_reg(X, y, w, b, lambda_ = 1):
     reg_cost = 0.
     
     ### START CODE HERE ###
-    for j in range(n):
-        
-        reg_cost_j = w[j]**2
-        
-        reg_cost += reg_cost_j
+    w = cast(w)
+    reg_cost = np.dot(w, w)
         
     ### END CODE HERE ### 
     
@@ -1282,7 +1356,7 @@ compute_cost_reg_test(compute_cost_reg)
 
 
 # UNQ_C6
-def compute_gradient_reg(X, y, w, b, lambda_ = 1): 
+def compute_gradient_reg(X, y, w, b, lambda_ = 1, out=None): 
     """
     Computes the gradient for linear regression 
  
@@ -1292,6 +1366,7 @@ def compute_gradient_reg(X, y, w, b, lambda_ = 1):
       w : (ndarray Shape (n,))    values of parameters of the model      
       b : (scalar)                value of parameter of the model  
       lambda_ : (scalar,float)    regularization constant
+      out : (ndarray Shape (n,))  optional preallocated array that dj_dw is written into
     Returns
       dj_db: (scalar)             The gradient of the cost w.r.t. the parameter b. 
       dj_dw: (ndarray Shape (n,)) The gradient of the cost w.r.t. the parameters w. 
@@ -1299,14 +1374,19 @@ def compute_gradient_reg(X, y, w, b, lambda_ = 1):
     """
     m, n = X.shape
     
-    dj_db, dj_dw = compute_gradient(X, y, w, b)
-
     ### START CODE HERE ###     
-    for j in range(n):
-        
-        dj_dw_j_reg = (lambda_ / m) * w[j]
-        
-        dj_dw[j] = dj_dw[j] + dj_dw_j_reg
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    err = sigmoid(X @ w + b) - y
+    dj_db = reduce_sum(err) / m
+    
+    # dj_dw = X.T @ err / m + (lambda_ / m) * w, built up in out when it is given.
+    # rmatvec keeps a scipy.sparse X sparse
+    dj_dw = rmatvec(X, err, out=out)
+    dj_dw /= m
+    dj_dw += (lambda_ / m) * w
+    if out is None:
+        dj_dw = cast(dj_dw)
         
     ### END CODE HERE ###         
         
@@ -1476,6 +1556,816 @@ print('Train Accuracy: %f'%(np.mean(p == y_train) * 100))
 #     <td> <b>Train Accuracy:</b>~ 80%</td> </tr>
 # </table>
 
+# <a name="4"></a>
+# ## 4 - Faster training
+# 
+# The graded functions above loop over every example and every feature in Python, which is easy to follow but slow. This optional section collects faster versions of the same computations. You don't need them to pass the assignment.
+# 
+# <a name="4.1"></a>
+# ### 4.1 Fused cost and gradient
+# 
+# Each iteration of `gradient_descent` calls `gradient_function` and then `cost_function`, which is two full passes over `X`. The cost and the gradient both start from the same prediction $f_{\mathbf{w},b}(\mathbf{X}) = g(\mathbf{X}\mathbf{w} + b)$, so both can be computed from a single matrix-vector product:
+# 
+# $$J(\mathbf{w},b) = \frac{1}{m} \sum\limits_{i = 0}^{m-1} \left[ -y^{(i)} \log\left(f_{\mathbf{w},b}\left( \mathbf{x}^{(i)} \right) \right) - \left( 1 - y^{(i)}\right) \log \left( 1 - f_{\mathbf{w},b}\left( \mathbf{x}^{(i)} \right) \right) \right] \qquad \frac{\partial J(\mathbf{w},b)}{\partial \mathbf{w}} = \frac{1}{m} \mathbf{X}^T(f_{\mathbf{w},b}(\mathbf{X}) - \mathbf{y})$$
+# 
+# - `compute_cost_gradient` and `compute_cost_gradient_reg` return `(cost, dj_db, dj_dw)`, following the `(dj_db, dj_dw)` order of `compute_gradient`.
+# - Pass them to `gradient_descent` as `cost_gradient_function`. `gradient_descent` then makes one pass over the data per iteration.
+# - `history_every=k` saves the cost every k iterations only, which keeps `J_history` short for long runs.
+# - The loss $-y\log(g(z)) - (1-y)\log(1-g(z))$ equals $\log(1+e^z) - yz$. Both the loss and $g(z)$ are computed from $e^{-|z|}$, which stays finite for any $z$, so large scores cause no overflow.
+# 
+# `logistic_cost_gradient` in `lab_utils_train.py` computes the same `(cost, dj_db, dj_dw)` with a regularization term. It is a library copy of `compute_cost_gradient_reg`: the solvers, sweeps and learning rate search in the `lab_utils_*.py` modules use it because a module cannot import functions from a notebook. The version here is written out so you can follow the fused computation. The check after the definitions also compares it with the library copy.
+
+# In[ ]:
+
+
+def compute_cost_gradient(X, y, w, b, lambda_=None):
+    """
+    Computes the cost and the gradient for logistic regression in one vectorized pass
+ 
+    Args:
+      X : (ndarray Shape (m,n)) data, m examples by n features
+      y : (ndarray Shape (m,))  target value 
+      w : (ndarray Shape (n,))  values of parameters of the model      
+      b : (scalar)              value of bias parameter of the model
+      lambda_: unused placeholder
+    Returns
+      total_cost: (scalar)             cost 
+      dj_db: (scalar)                  The gradient of the cost w.r.t. the parameter b. 
+      dj_dw: (ndarray Shape (n,))      The gradient of the cost w.r.t. the parameters w. 
+    """
+    m, n = X.shape
+    
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    z_wb = X @ w + b
+    # log(1 + e^z) - y*z and sigmoid(z) both from one exp(-|z|), which cannot overflow
+    e = np.exp(-np.abs(z_wb))
+    total_cost = reduce_mean(np.log1p(e) + np.maximum(z_wb, 0) - y * z_wb)
+    
+    err = np.where(z_wb >= 0, 1, e) / (1 + e) - y
+    dj_db = reduce_mean(err)
+    dj_dw = cast(X.T @ err) / m
+    
+    return total_cost, dj_db, dj_dw
+
+
+def compute_cost_gradient_reg(X, y, w, b, lambda_ = 1):
+    """
+    Computes the regularized cost and gradient for logistic regression in one vectorized pass
+ 
+    Args:
+      X : (ndarray Shape (m,n))   data, m examples by n features
+      y : (ndarray Shape (m,))    target value 
+      w : (ndarray Shape (n,))    values of parameters of the model      
+      b : (scalar)                value of bias parameter of the model
+      lambda_ : (scalar,float)    regularization constant
+    Returns
+      total_cost: (scalar)             cost 
+      dj_db: (scalar)                  The gradient of the cost w.r.t. the parameter b. 
+      dj_dw: (ndarray Shape (n,))      The gradient of the cost w.r.t. the parameters w. 
+    """
+    m, n = X.shape
+    
+    total_cost, dj_db, dj_dw = compute_cost_gradient(X, y, w, b)
+    w = cast(w)
+    
+    total_cost = total_cost + (lambda_/(2 * m)) * np.dot(w, w)
+    dj_dw = dj_dw + (lambda_ / m) * w
+    
+    return total_cost, dj_db, dj_dw
+
+
+# Check that the fused functions agree with the graded ones on the regularized dataset.
+
+# In[ ]:
+
+
+np.random.seed(1) 
+initial_w  = np.random.rand(X_mapped.shape[1]) - 0.5 
+initial_b = 0.5
+lambda_ = 0.5
+
+cost, dj_db, dj_dw = compute_cost_gradient_reg(X_mapped, y_train, initial_w, initial_b, lambda_)
+print("Regularized cost :", cost, compute_cost_reg(X_mapped, y_train, initial_w, initial_b, lambda_))
+print("dj_db:", dj_db, compute_gradient_reg(X_mapped, y_train, initial_w, initial_b, lambda_)[0])
+print("matches lab_utils_train.logistic_cost_gradient:",
+      all(np.allclose(a, c) for a, c in zip((cost, dj_db, dj_dw),
+          logistic_cost_gradient(X_mapped, y_train, initial_w, initial_b, lambda_))))
+
+
+# Now train the regularized model again with the fused function. The cost is saved every 10 iterations.
+
+# In[ ]:
+
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+
+lambda_ = 0.01;                                          
+iterations = 10000
+alpha = 0.01
+
+w,b, J_history,_ = gradient_descent(X_mapped, y_train, initial_w, initial_b, 
+                                    None, None, alpha, iterations, lambda_,
+                                    cost_gradient_function=compute_cost_gradient_reg,
+                                    history_every=10)
+print("Number of saved costs:", len(J_history))
+
+
+# <a name="4.2"></a>
+# ### 4.2 Mini-batch gradient descent
+# 
+# When the training set does not fit in memory, the parameters can be updated after every small batch of examples instead of after a full pass over the data. `minibatch_gradient_descent` in `lab_utils_train.py` runs this loop for linear and logistic regression alike:
+# - The batches come from a *batch source*: `array_batches` for arrays, `npy_batches` for memory-mapped `.npy` files, or `generator_batches`, which regroups chunks read by any generator (for example from a database or a large CSV file) into batches of a fixed size.
+# - The examples are reshuffled every epoch.
+# - `alpha` can be a number or a schedule such as `cosine_decay`, which lowers the learning rate smoothly to zero over the run.
+# 
+# The cell below streams the mapped microchip data in chunks of 20 rows, as if it were read from a file, and trains the regularized model in batches of 16.
+
+# In[ ]:
+
+
+from lab_utils_train import generator_batches, logistic_cost_gradient, cosine_decay, minibatch_gradient_descent
+
+def read_chunks():
+    """ Stands in for reading the training set from disk, 20 rows at a time, in a random order """
+    for start in np.random.permutation(np.arange(0, len(y_train), 20)):
+        yield X_mapped[start:start + 20], y_train[start:start + 20]
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+num_epochs = 200
+
+batches = generator_batches(read_chunks, batch_size=16)
+steps_per_epoch = math.ceil(len(y_train) / 16)
+w_sgd, b_sgd, J_hist_sgd = minibatch_gradient_descent(batches, initial_w, initial_b, logistic_cost_gradient,
+                                                      cosine_decay(0.5, num_epochs * steps_per_epoch),
+                                                      num_epochs, lambda_=0.01)
+
+p = predict(X_mapped, w_sgd, b_sgd)
+print('Train Accuracy: %f'%(np.mean(p == y_train) * 100))
+
+
+# <a name="4.3"></a>
+# ### 4.3 Stopping early
+# 
+# The notes above suggest running 100,000 iterations for better results, but most of those iterations change the cost very little. Instead of a fixed number of iterations, `gradient_descent` can take an `EarlyStopping` object from `lab_utils_train.py` that ends the run when:
+# - the relative change in cost $|J_{prev} - J| / |J_{prev}|$ stays below `tol` for `patience` checks in a row (`"tol"`),
+# - the norm of the gradient is below `gtol` (`"gtol"`), or
+# - more than `max_time` seconds have passed (`"max_time"`).
+# 
+# The returned `J_history` records why the run stopped in `J_history.stop_reason` (`"num_iters"` if it ran to the end) and how many iterations it took in `J_history.num_iters`.
+
+# In[ ]:
+
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+
+early_stopping = EarlyStopping(tol=1e-6, gtol=1e-5, patience=100, max_time=120)
+w,b, J_history,_ = gradient_descent(X_mapped, y_train, initial_w, initial_b, 
+                                    None, None, 0.01, 100000, 0.01,
+                                    cost_gradient_function=compute_cost_gradient_reg,
+                                    early_stopping=early_stopping)
+print(f"Stopped after {J_history.num_iters} iterations ({J_history.stop_reason})")
+
+
+# <a name="4.4"></a>
+# ### 4.4 Second-order solvers
+# 
+# Gradient descent with a fixed `alpha` needs thousands of steps, because each step only uses the slope of the cost. With only 27 features, we can afford to also use the curvature:
+# - **Newton's method** divides the gradient by the Hessian $\frac{1}{m}\mathbf{X}^T S \mathbf{X} + \frac{\lambda}{m} I$, where $S$ is diagonal with $f_{\mathbf{w},b}(\mathbf{x}^{(i)})(1 - f_{\mathbf{w},b}(\mathbf{x}^{(i)}))$. For logistic regression this is also known as iteratively reweighted least squares (IRLS), and it usually converges in fewer than 10 steps.
+# - **L-BFGS** builds an approximation of the curvature from the last few gradients, so it never forms the Hessian. It is the better choice when $n$ is large.
+# 
+# Both minimize the same regularized cost as `compute_cost_reg`/`compute_gradient_reg`. `fit` in `lab_utils_solvers.py` selects the method with `solver`. The cell below measures the time each solver takes to bring the gradient norm below `tol`. Gradient descent is given a one-minute budget.
+
+# In[ ]:
+
+
+import time
+from lab_utils_solvers import fit
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+
+for solver in ["gd", "newton", "lbfgs"]:
+    tic = time.perf_counter()
+    w_s, b_s, J_hist_s = fit(X_mapped, y_train, model="logistic", solver=solver, lambda_=0.01,
+                             w_in=initial_w, b_in=initial_b, alpha=0.01, num_iters=1000000,
+                             tol=1e-5, max_time=60)
+    toc = time.perf_counter()
+    p = predict(X_mapped, w_s, b_s)
+    print(f"{solver:>7}: cost {J_hist_s[-1]:.4f}, {J_hist_s.num_iters:7} iterations, {toc - tic:8.3f} s "
+          f"({J_hist_s.stop_reason}), train accuracy {np.mean(p == y_train) * 100:.1f}%")
+
+
+# <a name="4.5"></a>
+# ### 4.5 A numerically stable cost
+# 
+# Written as $-y\log(f) - (1-y)\log(1-f)$, the loss breaks down for large $|z|$. For $z = 40$, `sigmoid(z)` rounds to exactly 1 in float64, and `np.log(1 - f_wb)` becomes `-inf`. Unscaled features, like the exam scores in the first dataset, reach such values easily. In float32 it already happens near $z = 17$.
+# 
+# Substituting $f = \frac{1}{1+e^{-z}}$ gives a form that needs no $\log$ of a probability:
+# $$ -y\log(f) - (1-y)\log(1-f) = \log(1 + e^{z}) - yz $$
+# `np.logaddexp(0, z)` computes $\log(e^0 + e^z)$ without overflow, so `compute_cost` above uses this form. It is vectorized as a single matrix-vector product `X @ w`.
+# 
+# `compute_cost`, `compute_gradient_reg` and the fused functions of 4.1 return the dtype set with `set_floatx` from `lab_utils_precision.py`, float64 by default. `X` is used in its own dtype when it holds floats, so it is never copied, and `w`, `b` and `y` are cast to it. `precision("float32", accumulate="float64")` switches to float32 inside a `with` block: with float32 data the products and the elementwise work run in float32, and the sums over the examples are accumulated in float64.
+# 
+# The cell below compares the two forms on large values of $z$.
+
+# In[ ]:
+
+
+z = np.array([-800., -40., -17., 0., 17., 40., 800.])
+y_tmp = np.array([1., 1., 1., 1., 0., 0., 0.])
+
+with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+    for dtype in [np.float64, np.float32]:
+        z_d = z.astype(dtype)
+        f_d = sigmoid(z_d)
+        naive = -y_tmp * np.log(f_d) - (1 - y_tmp) * np.log(1 - f_d)
+        stable = np.logaddexp(0, z_d) - y_tmp.astype(dtype) * z_d
+        print(f"{np.dtype(dtype).name}\n  naive : {naive}\n  stable: {stable} ({stable.dtype})")
+
+X_tmp = np.array([[20., 30.], [1., 2.]], dtype=np.float32)
+with precision("float32", accumulate="float64"):
+    cost_tmp = compute_cost(X_tmp, np.array([0., 1.]), np.array([1., 1.]), 0.)
+print("compute_cost in float32:", cost_tmp, cost_tmp.dtype)
+
+
+# <a name="4.6"></a>
+# ### 4.6 Reusing the gradient buffer
+# 
+# `compute_gradient_reg` above is vectorized: the gradient is a single product of `X.T` with the prediction errors,
+# $$\frac{\partial J(\mathbf{w},b)}{\partial \mathbf{w}} = \frac{1}{m} \mathbf{X}^T\left(g(\mathbf{X}\mathbf{w} + b) - \mathbf{y}\right) + \frac{\lambda}{m}\mathbf{w}$$
+# It also accepts an `out` array. The gradient is then written into that array instead of a new one, so a training loop can allocate `dj_dw` once and reuse it at every step. `functools.partial` fixes `out` without changing the `gradient_function` signature that `gradient_descent` expects.
+# 
+# The cell below times one gradient evaluation and a short training run on $10^6$ examples with 100 features. The data is stored as float32 to halve its memory to 400 MB, and the functions run under a float32 `precision` policy so it is not converted back to float64.
+
+# In[ ]:
+
+
+import functools
+
+rng = np.random.default_rng(1)
+m_big, n_big = 10**6, 100
+X_big = rng.standard_normal((m_big, n_big), dtype=np.float32)
+y_big = (X_big[:, :5].sum(axis=1) > 0).astype(np.float32)
+w_big = np.zeros(n_big, dtype=np.float32)
+
+with precision("float32", accumulate="float64"):
+    tic = time.perf_counter()
+    compute_gradient_reg(X_big, y_big, w_big, 0., lambda_=1.)
+    print(f"One gradient evaluation: {time.perf_counter() - tic:.3f} s")
+
+    dj_dw_buffer = np.empty(n_big, dtype=np.float32)
+    gradient_reg_buffered = functools.partial(compute_gradient_reg, out=dj_dw_buffer)
+
+    tic = time.perf_counter()
+    w_big, b_big, _, _ = gradient_descent(X_big, y_big, w_big, 0., compute_cost_reg, gradient_reg_buffered,
+                                          1.0, 50, 1., history_every=10)
+    print(f"50 iterations of gradient descent: {time.perf_counter() - tic:.3f} s")
+print('Train Accuracy: %f'%(np.mean(predict(X_big[:10000], w_big, b_big) == y_big[:10000]) * 100))
+
+
+# <a name="4.7"></a>
+# ### 4.7 Scoring large datasets
+# 
+# `predict` above is vectorized and works through `X` in blocks of `chunk_size` rows, so its temporary memory does not grow with $m$. It takes a few extra arguments:
+# - `threshold` moves the decision threshold away from 0.5. Because the sigmoid is monotonic, $g(z) \geq t$ is the same as $z \geq \log\frac{t}{1-t}$, so the comparison is done on $z$ and the sigmoid is skipped. The threshold must lie strictly between 0 and 1: at the ends $\log\frac{t}{1-t}$ is infinite.
+# - `out` is an array the labels are written into, for example a slice of a larger result array or a `np.memmap` on disk.
+# 
+# `predict_proba` returns the probabilities $f_{\mathbf{w},b}(\mathbf{x}^{(i)})$ themselves, in the same blocked way.
+
+# In[ ]:
+
+
+def predict_proba(X, w, b, chunk_size=65536, out=None): 
+    """
+    Compute the probability that the label is 1 using learned logistic
+    regression parameters w
+    
+    Args:
+    X : (ndarray or scipy.sparse Shape (m, n))
+    w : (array_like Shape (n,))      Parameters of the model
+    b : (scalar, float)              Parameter of the model
+    chunk_size : (int)               Number of rows scored at a time
+    out : (ndarray Shape (m,))       Optional array the probabilities are written into
+
+    Returns:
+    f_wb: (ndarray (m,))             The probabilities for X, in the dtype of X and w
+                                     (at least float32)
+    """
+    m, n = X.shape
+    w = np.asarray(w)
+    if out is None:
+        out = np.empty(m, dtype=np.result_type(X.dtype, w, np.float32))
+    if issparse(X) and X.format == "csc":
+        chunk_size = max(m, 1)
+    
+    for start in range(0, m, chunk_size):
+        out[start:start + chunk_size] = sigmoid(X[start:start + chunk_size] @ w + b)
+        
+    return out
+
+
+# The cell below scores the $10^6$ examples from the previous section. It writes the labels into a preallocated array and uses a stricter threshold.
+
+# In[ ]:
+
+
+labels = np.empty(m_big, dtype=np.int8)
+proba = np.empty(m_big, dtype=np.float32)
+
+tic = time.perf_counter()
+predict(X_big, w_big, b_big, out=labels)
+print(f"predict:       {time.perf_counter() - tic:.3f} s, positive rate {labels.mean():.3f}")
+
+tic = time.perf_counter()
+predict_proba(X_big, w_big, b_big, out=proba)
+print(f"predict_proba: {time.perf_counter() - tic:.3f} s, mean probability {proba.mean():.3f}")
+
+strict = predict(X_big, w_big, b_big, threshold=0.9)
+print(f"threshold 0.9: positive rate {strict.mean():.3f}, agreement with predict_proba >= 0.9: {np.mean(strict == (proba >= 0.9)):.6f}")
+
+# w can be any array_like, e.g. a list
+w_list = list(w_big)
+print(f"list w gives the same results: {np.array_equal(predict(X_big[:1000], w_list, b_big), labels[:1000])}, "
+      f"{np.allclose(predict_proba(X_big[:1000], w_list, b_big), proba[:1000])}")
+
+
+# <a name="4.8"></a>
+# ### 4.8 More than two classes
+# 
+# So far each model has a single weight vector $\mathbf{w}$ of shape (n,) and separates two classes. With $K$ classes there are two common extensions, and both train all classes together. The $K$ weight vectors are stacked as the columns of a matrix $\mathbf{W}$ of shape (n,K), and the biases form $\mathbf{b}$ of shape (K,). Then $\mathbf{Z} = \mathbf{X}\mathbf{W} + \mathbf{b}$ holds the scores of every example for every class in one matrix product.
+# 
+# - **One-vs-rest (OvR)** trains $K$ independent binary classifiers, where classifier $k$ separates class $k$ from all the others. Each column uses the same sigmoid, cost and gradient as `compute_gradient_reg`, with the labels one-hot encoded as $\mathbf{Y}$ of shape (m,K):
+# $$\frac{\partial J}{\partial \mathbf{W}} = \frac{1}{m}\mathbf{X}^T\left(g(\mathbf{Z}) - \mathbf{Y}\right) + \frac{\lambda}{m}\mathbf{W}$$
+# - **Softmax (multinomial) regression** models the probability of each class with $\text{softmax}(\mathbf{z})_k = e^{z_k} / \sum_j e^{z_j}$, so the probabilities of an example sum to one. The gradient has the same form, with $g(\mathbf{Z})$ replaced by $\text{softmax}(\mathbf{Z})$ applied row by row.
+# 
+# Both functions below follow the fused `(cost, dj_db, dj_dw)` protocol of section 4.1. The `gradient_descent` function from section 2.6 then trains all $K$ classes in a single run, because its updates `w - alpha * dj_dw` work on an (n,K) matrix as well. In both cases the predicted class is the one with the largest score $z_k$.
+
+# In[ ]:
+
+
+def one_hot(y, K):
+    """
+    Encodes integer labels as rows of a (m,K) matrix with a single 1
+    Args:
+      y : (ndarray Shape (m,))  labels in 0..K-1
+      K : (int)                 number of classes
+    Returns
+      Y : (ndarray Shape (m,K)) one-hot labels
+    """
+    Y = np.zeros((len(y), K))
+    Y[np.arange(len(y)), y] = 1.
+    return Y
+
+
+def compute_cost_gradient_ovr(X, Y, W, b, lambda_ = 1):
+    """
+    Computes the regularized cost and gradient of K one-vs-rest logistic regression
+    models in one pass. The cost is the sum of the K binary costs.
+ 
+    Args:
+      X : (ndarray Shape (m,n))   data, m examples by n features
+      Y : (ndarray Shape (m,K))   one-hot target values
+      W : (ndarray Shape (n,K))   values of parameters of the K models
+      b : (ndarray Shape (K,))    values of bias parameters of the K models
+      lambda_ : (scalar,float)    regularization constant
+    Returns
+      total_cost: (scalar)             cost 
+      dj_db: (ndarray Shape (K,))      The gradient of the cost w.r.t. the parameters b. 
+      dj_dw: (ndarray Shape (n,K))     The gradient of the cost w.r.t. the parameters W. 
+    """
+    m, n = X.shape
+    
+    X = cast_data(X)
+    Y, W, b = cast(Y, X.dtype), cast(W, X.dtype), cast(b, X.dtype)
+    Z = X @ W + b
+    total_cost = reduce_sum(np.logaddexp(0, Z) - Y * Z) / m + (lambda_/(2 * m)) * reduce_sum(np.square(W))
+    
+    err = sigmoid(Z) - Y
+    dj_db = reduce_sum(err, axis=0) / m
+    dj_dw = cast((X.T @ err) / m + (lambda_ / m) * W)
+    
+    return total_cost, dj_db, dj_dw
+
+
+def compute_cost_gradient_softmax(X, y, W, b, lambda_ = 1):
+    """
+    Computes the regularized cost and gradient of softmax (multinomial) logistic
+    regression in one pass
+ 
+    Args:
+      X : (ndarray Shape (m,n))   data, m examples by n features
+      y : (ndarray Shape (m,))    target labels in 0..K-1
+      W : (ndarray Shape (n,K))   values of parameters of the model
+      b : (ndarray Shape (K,))    values of bias parameters of the model
+      lambda_ : (scalar,float)    regularization constant
+    Returns
+      total_cost: (scalar)             cost 
+      dj_db: (ndarray Shape (K,))      The gradient of the cost w.r.t. the parameters b. 
+      dj_dw: (ndarray Shape (n,K))     The gradient of the cost w.r.t. the parameters W. 
+    """
+    m, n = X.shape
+    rows = np.arange(m)
+    
+    X = cast_data(X)
+    W, b = cast(W, X.dtype), cast(b, X.dtype)
+    Z = X @ W + b
+    # log(sum_j e^z_j), shifted by the largest score so np.exp cannot overflow
+    Z_max = np.max(Z, axis=1, keepdims=True)
+    log_sum_exp = Z_max + np.log(np.sum(np.exp(Z - Z_max), axis=1, keepdims=True))
+    total_cost = reduce_mean(log_sum_exp[:, 0] - Z[rows, y]) + (lambda_/(2 * m)) * reduce_sum(np.square(W))
+    
+    # softmax(Z) - one_hot(y), computed in place
+    err = np.exp(Z - log_sum_exp)
+    err[rows, y] -= 1
+    dj_db = reduce_sum(err, axis=0) / m
+    dj_dw = cast((X.T @ err) / m + (lambda_ / m) * W)
+    
+    return total_cost, dj_db, dj_dw
+
+
+def predict_multiclass(X, W, b):
+    """
+    Predicts the class with the largest score, for one-vs-rest and softmax models alike
+    Args:
+      X : (ndarray Shape (m,n))
+      W : (ndarray Shape (n,K))   Parameters of the model
+      b : (ndarray Shape (K,))    Parameters of the model
+    Returns
+      p : (ndarray Shape (m,))    predicted labels in 0..K-1
+    """
+    return np.argmax(X @ W + b, axis=1)
+
+
+# Let's try both on a synthetic dataset with 100 classes, where each class is a cloud of points around its own center in 20 dimensions.
+
+# In[ ]:
+
+
+rng = np.random.default_rng(1)
+K, n_feat, m_mc = 100, 20, 5000
+centers = rng.normal(0, 2, (K, n_feat))
+y_mc = rng.integers(0, K, m_mc)
+X_mc = centers[y_mc] + rng.normal(0, 1, (m_mc, n_feat))
+
+W_init = np.zeros((n_feat, K))
+b_init = np.zeros(K)
+
+tic = time.perf_counter()
+W_ovr, b_ovr, _, _ = gradient_descent(X_mc, one_hot(y_mc, K), W_init, b_init, None, None, 0.5, 200, 0.1,
+                                      cost_gradient_function=compute_cost_gradient_ovr)
+print(f"One-vs-rest: {time.perf_counter() - tic:.2f} s, "
+      f"train accuracy {np.mean(predict_multiclass(X_mc, W_ovr, b_ovr) == y_mc) * 100:.1f}%")
+
+tic = time.perf_counter()
+W_sm, b_sm, _, _ = gradient_descent(X_mc, y_mc, W_init, b_init, None, None, 0.5, 200, 0.1,
+                                    cost_gradient_function=compute_cost_gradient_softmax)
+print(f"Softmax:     {time.perf_counter() - tic:.2f} s, "
+      f"train accuracy {np.mean(predict_multiclass(X_mc, W_sm, b_sm) == y_mc) * 100:.1f}%")
+
+
+# `EarlyStopping` works for the multi-class models as well. Its gradient criterion `gtol` takes the norm over all of `W` and all K entries of `b`. Below, both models get up to 1000 iterations and stop once that norm is below 0.05.
+
+# In[ ]:
+
+
+for name, cost_gradient, targets in [("One-vs-rest", compute_cost_gradient_ovr, one_hot(y_mc, K)),
+                                     ("Softmax", compute_cost_gradient_softmax, y_mc)]:
+    W_es, b_es, J_es, _ = gradient_descent(X_mc, targets, W_init, b_init, None, None, 0.5, 1000, 0.1,
+                                           cost_gradient_function=cost_gradient, history_every=100,
+                                           early_stopping=EarlyStopping(gtol=0.05))
+    print(f"{name}: stopped ({J_es.stop_reason}) after {J_es.num_iters} iterations, "
+          f"train accuracy {np.mean(predict_multiclass(X_mc, W_es, b_es) == y_mc) * 100:.1f}%")
+
+
+# <a name="4.9"></a>
+# ### 4.9 Polynomial features on the fly
+# 
+# `map_feature` builds the full $m \times 27$ matrix of polynomial terms up front. The number of terms grows quickly with the degree and the number of inputs: with $n$ inputs there are $\binom{n+d}{d} - 1$ monomials of degree 1 to $d$. With 10 inputs and degree 6 that is already 8007 columns.
+# 
+# `PolynomialMap` below generates the same terms from the raw inputs, one block of rows at a time:
+# - The *layout* of the monomials is computed once per `(n_in, degree, interaction_only)` and cached. It lists the monomials in the same order as `map_feature`: by degree, then with the powers of $x_1$ decreasing. Each monomial is stored as a lower-degree monomial times one input column, so a block is built with one multiplication per column.
+# - `interaction_only=True` keeps only products of distinct inputs such as $x_1x_2$, and drops powers such as $x_1^2$.
+# - `compute_cost_gradient_poly` expands `chunk_size` rows at a time inside the cost and gradient computation. The full expanded matrix is never in memory, only one `chunk_size` $\times$ `n_out` block that is reused for every chunk.
+
+# In[ ]:
+
+
+import itertools
+
+@functools.lru_cache(maxsize=None)
+def polynomial_layout(n_in, degree, interaction_only=False):
+    """
+    Lists the monomials of degree 1..degree in n_in inputs
+    Args:
+      n_in : (int)              number of input features
+      degree : (int)            highest total degree
+      interaction_only : (bool) only products of distinct inputs
+    Returns
+      parent : (tuple of int)   for each monomial, the index of the monomial it extends,
+                                or -1 for the inputs themselves
+      column : (tuple of int)   for each monomial, the input column it is multiplied by
+    """
+    combinations = itertools.combinations if interaction_only else itertools.combinations_with_replacement
+    index = {}
+    parent, column = [], []
+    for d in range(1, degree + 1):
+        for combo in combinations(range(n_in), d):
+            index[combo] = len(parent)
+            parent.append(index[combo[:-1]] if d > 1 else -1)
+            column.append(combo[-1])
+    return tuple(parent), tuple(column)
+
+
+class PolynomialMap:
+    """
+    Polynomial feature map that expands raw inputs into monomials a block of rows at a time
+    Args:
+      n_in : (int)              number of input features
+      degree : (int)            highest total degree
+      interaction_only : (bool) only products of distinct inputs
+    """
+    def __init__(self, n_in, degree=6, interaction_only=False):
+        self.n_in = n_in
+        self.degree = degree
+        self.parent, self.column = polynomial_layout(n_in, degree, interaction_only)
+        self.n_out = len(self.parent)
+
+    def transform(self, X, out=None):
+        """
+        Expands X (ndarray Shape (m,n_in)) into its monomials, an ndarray of shape (m,n_out).
+        out is an optional array of at least that shape to write into.
+        """
+        m = X.shape[0]
+        F = np.empty((m, self.n_out), dtype=X.dtype) if out is None else out[:m]
+        for k, (parent, col) in enumerate(zip(self.parent, self.column)):
+            if parent < 0:
+                F[:, k] = X[:, col]
+            else:
+                np.multiply(F[:, parent], X[:, col], out=F[:, k])
+        return F
+
+
+def compute_cost_gradient_poly(X, y, w, b, lambda_ = 1, poly=None, chunk_size=4096):
+    """
+    Computes the regularized logistic cost and gradient on the polynomial features of X
+    without building the full expanded matrix
+ 
+    Args:
+      X : (ndarray Shape (m,n_in))  raw data, m examples by n_in features
+      y : (ndarray Shape (m,))      target value 
+      w : (ndarray Shape (n_out,))  values of parameters of the model      
+      b : (scalar)                  value of bias parameter of the model
+      lambda_ : (scalar,float)      regularization constant
+      poly : (PolynomialMap)        the feature map, degree 6 like map_feature if None
+      chunk_size : (int)            number of rows expanded at a time
+    Returns
+      total_cost: (scalar)             cost 
+      dj_db: (scalar)                  The gradient of the cost w.r.t. the parameter b. 
+      dj_dw: (ndarray Shape (n_out,))  The gradient of the cost w.r.t. the parameters w. 
+    """
+    m = X.shape[0]
+    if poly is None:
+        poly = PolynomialMap(X.shape[1], degree=6)   # the layout is cached, so this is cheap
+    # the features are built in the dtype of X, so w and b are cast to it
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    F_buffer = np.empty((min(chunk_size, m), poly.n_out), dtype=X.dtype)
+    
+    loss_sum = 0.
+    dj_db = 0.
+    dj_dw = np.zeros(poly.n_out, dtype=X.dtype)
+    for start in range(0, m, chunk_size):
+        F = poly.transform(X[start:start + chunk_size], out=F_buffer)
+        y_c = y[start:start + chunk_size]
+        z_wb = F @ w + b
+        loss_sum += reduce_sum(np.logaddexp(0, z_wb) - y_c * z_wb)
+        err = sigmoid(z_wb) - y_c
+        dj_db += reduce_sum(err)
+        dj_dw += F.T @ err
+    
+    total_cost = loss_sum / m + (lambda_/(2 * m)) * reduce_sum(np.square(w))
+    dj_dw = cast(dj_dw / m + (lambda_ / m) * w)
+    
+    return total_cost, dj_db / m, dj_dw
+
+
+# First, check that the map reproduces `map_feature` on the microchip data. Then train the regularized model from the raw two-column `X_train` in chunks of 32 rows, and try a higher degree without building the expanded matrix.
+
+# In[ ]:
+
+
+poly6 = PolynomialMap(2, degree=6)
+print("Number of terms:", poly6.n_out, "matches map_feature:", np.allclose(poly6.transform(X_train), X_mapped))
+
+np.random.seed(1)
+initial_w = np.random.rand(poly6.n_out)-0.5
+initial_b = 1.
+
+cost_gradient_poly6 = functools.partial(compute_cost_gradient_poly, poly=poly6, chunk_size=32)
+w,b, J_history,_ = gradient_descent(X_train, y_train, initial_w, initial_b, 
+                                    None, None, 0.01, 10000, 0.01,
+                                    cost_gradient_function=cost_gradient_poly6)
+
+poly10 = PolynomialMap(2, degree=10)
+cost_gradient_poly10 = functools.partial(compute_cost_gradient_poly, poly=poly10, chunk_size=32)
+w10,b10, _,_ = gradient_descent(X_train, y_train, np.zeros(poly10.n_out), 1., 
+                                None, None, 0.01, 10000, 0.01,
+                                cost_gradient_function=cost_gradient_poly10)
+p = predict(poly10.transform(X_train), w10, b10)
+print(f"Degree 10, {poly10.n_out} terms, train accuracy: {np.mean(p == y_train) * 100:.1f}%")
+
+
+# <a name="4.10"></a>
+# ### 4.10 Sweeping $\lambda$ in parallel
+# 
+# To choose the regularization parameter, the model is trained once per candidate $\lambda$. The runs are independent, so `parallel_sweep` from `lab_utils_sweep.py` trains them at the same time in a pool of worker processes. `X_mapped` and `y_train` are put in shared memory once, and every worker reads them from there. With enough CPU cores, the whole sweep takes about as long as a single training run.
+
+# In[ ]:
+
+
+from lab_utils_sweep import parallel_sweep, fit_gradient_descent, format_table
+
+lambdas = [0., 1e-3, 1e-2, 0.1, 1., 10.]
+results = parallel_sweep(fit_gradient_descent,
+                         [{"alpha": 0.1, "num_iters": 10000, "lambda_": l, "model": "logistic"} for l in lambdas],
+                         {"X": X_mapped, "y": y_train})
+for row in results:
+    row["accuracy"] = np.mean(predict(X_mapped, row["w"], row["b"]) == y_train) * 100
+print(format_table(results, ["lambda_", "cost", "accuracy", "time"]))
+
+
+# All these runs use the same `X_mapped`, and they differ only in $\lambda$. They can also be trained together in one process: `multi_gradient_descent` stacks the 6 parameter vectors as the columns of a $(n, P)$ matrix $\mathbf{W}$. Each step then computes the gradients of all the models with one matrix-matrix product $\mathbf{X}^T \mathbf{E}$ of the residuals, instead of 6 matrix-vector products. Every column has its own $\alpha$ and $\lambda$.
+
+# In[ ]:
+
+
+from lab_utils_sweep import multi_gradient_descent
+
+tic = time.perf_counter()
+W_sweep, b_sweep, J_sweep = multi_gradient_descent(X_mapped, y_train, alphas=np.full(len(lambdas), 0.1),
+                                                   lambdas=lambdas, num_iters=10000, model="logistic")
+print(f"{len(lambdas)} models in {time.perf_counter() - tic:.2f} s")
+for p, lambda_ in enumerate(lambdas):
+    accuracy = np.mean(predict(X_mapped, W_sweep[:, p], b_sweep[p]) == y_train) * 100
+    print(f"lambda_ {lambda_:6}: cost {J_sweep[-1, p]:0.4f}, accuracy {accuracy:.1f}%")
+
+
+# <a name="4.11"></a>
+# ### 4.11 Sparse features
+# 
+# Categorical data, like a city or a product id, is usually one-hot encoded: one column per category and a single 1 per feature in each row. With thousands of categories more than 99% of `X` is zero. Stored as a `scipy.sparse` CSR matrix, only the nonzero values and their positions are kept.
+# 
+# `compute_cost`, `compute_gradient`, `compute_cost_reg`, `compute_gradient_reg`, the fused functions of 4.1, `predict` and `predict_proba` all accept such a matrix. They only use the products `X @ w` and `X.T @ err`, and scipy computes these by visiting the nonzeros, so `X` is never converted to a dense array. The time per iteration and the memory then grow with the number of nonzeros rather than with $m \times n$.
+# 
+# The cell below builds $2 \times 10^5$ examples with 20 categorical features of 1000 categories each, so $n = 20000$. As a dense float64 array, `X` would take 32 GB. In CSR format it takes about 50 MB. Each column is nonzero in only 0.1% of the rows, so the gradients are small and a larger learning rate than before works.
+
+# In[ ]:
+
+
+from lab_utils_sparse import one_hot_features
+
+rng = np.random.default_rng(2)
+m_sp, n_fields, n_cat = 200000, 20, 1000
+codes = rng.integers(0, n_cat, size=(m_sp, n_fields))
+X_sp = one_hot_features(codes, [n_cat] * n_fields)
+w_true = rng.standard_normal(X_sp.shape[1])
+y_sp = (X_sp @ w_true + rng.standard_normal(m_sp) > 0).astype(float)
+
+nbytes = X_sp.data.nbytes + X_sp.indices.nbytes + X_sp.indptr.nbytes
+print(f"X_sp: {X_sp.shape}, {X_sp.nnz} nonzeros ({X_sp.nnz / (X_sp.shape[0] * X_sp.shape[1]):.2%}), "
+      f"{nbytes / 1e6:.0f} MB, dense would be {X_sp.shape[0] * X_sp.shape[1] * 8 / 1e9:.0f} GB")
+
+tic = time.perf_counter()
+w_sp, b_sp, _, _ = gradient_descent(X_sp, y_sp, np.zeros(X_sp.shape[1]), 0., None, None, 5.0, 100, 1.,
+                                    cost_gradient_function=compute_cost_gradient_reg, history_every=10)
+print(f"100 iterations: {time.perf_counter() - tic:.2f} s")
+print('Train Accuracy: %f'%(np.mean(predict(X_sp, w_sp, b_sp) == y_sp) * 100))
+
+
+# <a name="4.12"></a>
+# ### 4.12 Checkpoints
+# 
+# A run of 100,000 iterations holds `w`, `b` and `J_history` only in memory, so an interruption loses all of its progress. Pass a `Checkpoint` from `lab_utils_train.py` to `gradient_descent` to save the iteration count, the parameters and the cost history to a `.npz` file every `every` iterations, and also at the end of the run. Each save goes to a temporary file first, which is then renamed over the previous checkpoint, so a crash during a save cannot corrupt it. When the file already exists, `gradient_descent` resumes from it.
+# 
+# Below, a time budget of one second stands in for an interruption. The second call picks up from the saved iteration and finishes the 100,000 iterations.
+
+# In[ ]:
+
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+
+import os
+import tempfile
+
+# the checkpoint goes to a temporary directory; in a real run, keep it next to the
+# model. resume=False starts from scratch even if an old checkpoint exists
+checkpoint = Checkpoint(os.path.join(tempfile.mkdtemp(), "logistic_ckpt.npz"), every=10000, resume=False)
+w,b, J_history,_ = gradient_descent(X_mapped, y_train, initial_w, initial_b, 
+                                    None, None, 0.01, 100000, 0.01,
+                                    cost_gradient_function=compute_cost_gradient_reg,
+                                    history_every=100, early_stopping=EarlyStopping(max_time=1),
+                                    checkpoint=checkpoint)
+
+checkpoint.resume = True
+w,b, J_history,_ = gradient_descent(X_mapped, y_train, initial_w, initial_b, 
+                                    None, None, 0.01, 100000, 0.01,
+                                    cost_gradient_function=compute_cost_gradient_reg,
+                                    history_every=100, checkpoint=checkpoint)
+print(f"{len(J_history)} costs saved, final cost {J_history[-1]:0.4f}")
+
+
+# <a name="4.13"></a>
+# ### 4.13 Momentum, RMSProp and Adam
+# 
+# The exam scores of the first dataset range from 30 to 100, while the bias starts near -8. The cost is a long, narrow valley, and the plain update $\mathbf{w} = \mathbf{w} - \alpha \frac{\partial J}{\partial \mathbf{w}}$ needs a small $\alpha$ to stay stable, so it crawls along the valley floor. `gradient_descent` takes an `optimizer` from `lab_utils_train.py` that computes the update from the gradient in a different way:
+# - `Momentum` and `Nesterov` accumulate past gradients in a velocity, which keeps moving along the valley and cancels the zig-zag across it.
+# - `RMSProp` divides each parameter's step by a running root mean square of its gradient, so every parameter moves at a similar rate.
+# - `Adam` combines the two, and is the default optimizer of many neural network libraries.
+# 
+# The optimizers allocate their state arrays once and then update `w` in place. They only need the gradient, so they work with `gradient_function` or `cost_gradient_function` alike, and a `Checkpoint` also saves their state. Each one below runs for 10000 iterations with an $\alpha$ that suits it.
+
+# In[ ]:
+
+
+from lab_utils_train import Momentum, Nesterov, RMSProp, Adam
+
+X_exam, y_exam = load_data("data/ex2data1.txt")
+np.random.seed(1)
+initial_w = 0.01 * (np.random.rand(2) - 0.5)
+initial_b = -8
+
+results = {}
+for name, optimizer, alpha in [("plain", None, 0.001), ("Momentum", Momentum(), 0.003),
+                               ("Nesterov", Nesterov(), 0.001), ("RMSProp", RMSProp(), 0.003),
+                               ("Adam", Adam(), 0.03)]:
+    print(name)
+    _, _, J_opt, _ = gradient_descent(X_exam, y_exam, initial_w, initial_b, None, None, alpha, 10000, 0,
+                                      cost_gradient_function=compute_cost_gradient, history_every=100,
+                                      optimizer=optimizer)
+    results[name] = J_opt[-1]
+
+for name, cost in results.items():
+    print(f"{name:9}: cost after 10000 iterations {cost:0.4f}")
+
+
+# The optimizers also train the multi-class models of section 4.8, where `b` is a vector of K biases. Below, Adam and RMSProp train the softmax model for 200 iterations.
+
+# In[ ]:
+
+
+for name, optimizer, alpha in [("RMSProp", RMSProp(), 0.01), ("Adam", Adam(), 0.05)]:
+    W_opt, b_opt, J_opt, _ = gradient_descent(X_mc, y_mc, W_init, b_init, None, None, alpha, 200, 0.1,
+                                              cost_gradient_function=compute_cost_gradient_softmax,
+                                              history_every=100, optimizer=optimizer)
+    print(f"{name:8}: cost {J_opt[-1]:0.4f}, "
+          f"train accuracy {np.mean(predict_multiclass(X_mc, W_opt, b_opt) == y_mc) * 100:.1f}%")
+
+
+# <a name="4.14"></a>
+# ### 4.14 A training log of fixed size
+# 
+# `gradient_descent` appends each saved cost to the list `J_history`, up to 100,000 entries, and a full copy of `w` to `w_history` at every printout. A `HistoryRecorder` from `lab_utils_train.py` keeps the log in NumPy arrays allocated once:
+# - The costs are grouped into buckets of `every` iterations. Each bucket keeps the minimum, maximum and last cost, so spikes between the kept points are still visible.
+# - The buckets are a ring buffer of `capacity` entries. Once it is full, the oldest bucket is overwritten.
+# - With `snapshot_every`, a copy of `w` is kept every `snapshot_every` iterations, in a second ring buffer of `snapshot_capacity` rows.
+# 
+# However long the run, the memory of the log stays the same.
+
+# In[ ]:
+
+
+np.random.seed(1)
+initial_w = np.random.rand(X_mapped.shape[1])-0.5
+initial_b = 1.
+
+history = HistoryRecorder(capacity=200, every=500, snapshot_every=5000, snapshot_capacity=20)
+w,b, J_history,_ = gradient_descent(X_mapped, y_train, initial_w, initial_b, 
+                                    None, None, 0.01, 100000, 0.01,
+                                    cost_gradient_function=compute_cost_gradient_reg,
+                                    history=history)
+print(f"{len(history)} buckets and {history.n_snapshots} snapshots in {history.nbytes} bytes")
+
+log = history.buckets()
+snapshot_iterations, W_snapshots = history.parameter_snapshots()
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+ax1.fill_between(log["iteration"], log["min"], log["max"], alpha=0.3, label="min to max")
+ax1.plot(log["iteration"], log["last"], label="last")
+ax1.set_xlabel("iteration"); ax1.set_ylabel("cost"); ax1.legend()
+ax2.plot(snapshot_iterations, W_snapshots[:, :5], marker=".")
+ax2.set_xlabel("iteration"); ax2.set_ylabel("$w_0 .. w_4$")
+plt.show()
+
+
 # **Congratulations on completing the final lab of this course! We hope to see you in Course 2 where you will use more advanced learning algorithms such as neural networks and decision trees. Keep learning!**
 
 # <details>
@@ -39,6 +39,7 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense
 import matplotlib.pyplot as plt
 from autils import *
+from lab_utils_precision import cast, cast_data
 get_ipython().run_line_magic('matplotlib', 'inline')
 
 import logging
@@ -360,13 +361,14 @@ else:
 print(f"prediction after threshold: {yhat}")
 
 
-# Let's compare the predictions vs the labels for a random sample of 64 digits. This takes a moment to run.
+# Let's compare the predictions vs the labels for a random sample of 64 digits. The 64 images are predicted together with a single call of `model.predict`.
 
 # In[34]:
 
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
+from lab_utils_inference import predict_labels
 # You do not need to modify anything in this cell
 
 m, n = X.shape
@@ -374,9 +376,12 @@ m, n = X.shape
 fig, axes = plt.subplots(8,8, figsize=(8,8))
 fig.tight_layout(pad=0.1,rect=[0, 0.03, 1, 0.92]) #[left, bottom, right, top]
 
+# Select random indices and predict them all at once using the Neural Network
+random_indices = np.random.randint(m, size=axes.size)
+yhat = predict_labels(model.predict, X, random_indices)
+
 for i,ax in enumerate(axes.flat):
-    # Select random indices
-    random_index = np.random.randint(m)
+    random_index = random_indices[i]
     
     # Select rows corresponding to the random indices and
     # reshape the image
@@ -385,15 +390,8 @@ for i,ax in enumerate(axes.flat):
     # Display the image
     ax.imshow(X_random_reshaped, cmap='gray')
     
-    # Predict using the Neural Network
-    prediction = model.predict(X[random_index].reshape(1,400))
-    if prediction >= 0.5:
-        yhat = 1
-    else:
-        yhat = 0
-    
     # Display the label above the image
-    ax.set_title(f"{y[random_index,0]},{yhat}")
+    ax.set_title(f"{y[random_index,0]},{yhat[i]}")
     ax.set_axis_off()
 fig.suptitle("Label, yhat", fontsize=16)
 plt.show()
@@ -556,13 +554,14 @@ else:
 print( "yhat = ", yhat, " label= ", y[500,0])
 
 
-# Run the following cell to see predictions from both the Numpy model and the Tensorflow model. This takes a moment to run.
+# Run the following cell to see predictions from both the Numpy model and the Tensorflow model. Tensorflow predicts the 64 images with a single call of `model.predict`; `my_sequential` is called once per image, which is fast since it only uses NumPy.
 
 # In[47]:
 
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
+from lab_utils_inference import predict_labels
 # You do not need to modify anything in this cell
 
 m, n = X.shape
@@ -570,9 +569,18 @@ m, n = X.shape
 fig, axes = plt.subplots(8,8, figsize=(8,8))
 fig.tight_layout(pad=0.1,rect=[0, 0.03, 1, 0.92]) #[left, bottom, right, top]
 
+# Select random indices
+random_indices = np.random.randint(m, size=axes.size)
+
+# Predict using the Neural Network implemented in Numpy
+my_yhat = predict_labels(lambda X_: np.array([my_sequential(x, W1_tmp, b1_tmp, W2_tmp, b2_tmp, W3_tmp, b3_tmp) for x in X_]),
+                         X, random_indices)
+
+# Predict using the Neural Network implemented in Tensorflow
+tf_yhat = predict_labels(model.predict, X, random_indices)
+
 for i,ax in enumerate(axes.flat):
-    # Select random indices
-    random_index = np.random.randint(m)
+    random_index = random_indices[i]
     
     # Select rows corresponding to the random indices and
     # reshape the image
@@ -580,17 +588,9 @@ for i,ax in enumerate(axes.flat):
     
     # Display the image
     ax.imshow(X_random_reshaped, cmap='gray')
-
-    # Predict using the Neural Network implemented in Numpy
-    my_prediction = my_sequential(X[random_index], W1_tmp, b1_tmp, W2_tmp, b2_tmp, W3_tmp, b3_tmp )
-    my_yhat = int(my_prediction >= 0.5)
-
-    # Predict using the Neural Network implemented in Tensorflow
-    tf_prediction = model.predict(X[random_index].reshape(1,400))
-    tf_yhat = int(tf_prediction >= 0.5)
     
     # Display the label above the image
-    ax.set_title(f"{y[random_index,0]},{tf_yhat},{my_yhat}")
+    ax.set_title(f"{y[random_index,0]},{tf_yhat[i]},{my_yhat[i]}")
     ax.set_axis_off() 
 fig.suptitle("Label, yhat Tensorflow, yhat Numpy", fontsize=16)
 plt.show()
@@ -642,6 +642,8 @@ def my_dense_v(A_in, W, b, g):
       A_out (tf.Tensor or ndarray (m,j)) : m examples, j units
     """
 ### START CODE HERE ### 
+    A_in = cast_data(A_in)                            # see lab_utils_precision
+    W, b = cast(W, A_in.dtype), cast(b, A_in.dtype)
     Z = np.matmul(A_in, W) + b
     A_out = g(Z)
     
@@ -743,6 +745,67 @@ Yhat = (Prediction >= 0.5).numpy().astype(int)
 print("predict a zero: ",Yhat[0], "predict a one: ", Yhat[500])
 
 
+# `my_dense_v` computes in the dtype of its input `A_in` when it holds floats, and casts `W` and `b` to it, so the data is never copied; other inputs are converted to the dtype set with `set_floatx` in `lab_utils_precision.py`. The weights copied from Tensorflow are float32, so float32 is enough for this model and halves the memory the layers read. `compare_precision` runs the model with all its arrays in float64 and in float32 and reports the largest difference relative to the float64 output, together with the dtype each run returned, so an accidental upcast to float64 would show up.
+
+# In[ ]:
+
+
+from lab_utils_precision import compare_precision
+
+max_rel_err, dtypes = compare_precision(my_sequential_v, X, W1_tmp, b1_tmp, W2_tmp, b2_tmp, W3_tmp, b3_tmp)
+print(f"float32 vs float64: max relative difference {max_rel_err:.2e}, output dtype {dtypes[0]}")
+
+
+# Once the model is trained, Tensorflow is not needed to use it. `DenseModel` in `lab_utils_inference.py` copies the weights and activations of the Dense layers and computes the layers the same way `my_dense_v` does, for any number of layers. It can be saved to a `.npz` file and loaded by a program that only imports NumPy. Below, it reproduces `Prediction` and is compared with `model.predict` on a single example.
+
+# In[ ]:
+
+
+import os
+import tempfile
+import time
+from lab_utils_inference import DenseModel
+
+model_file = os.path.join(tempfile.mkdtemp(), "my_model.npz")
+net = DenseModel.from_keras(model, dtype=np.float32)
+net.save(model_file)
+net = DenseModel.load(model_file, dtype=np.float32)
+print(net)
+print(f"max difference to my_sequential_v: {np.max(np.abs(net.predict(X) - np.asarray(Prediction))):.2e}")
+
+for name, f in [("model.predict", lambda x: model.predict(x.reshape(1,400), verbose=0)), ("DenseModel", net.predict)]:
+    tic = time.perf_counter()
+    for i in range(100):
+        f(X[i])
+    print(f"{name:14}: {(time.perf_counter() - tic) * 10:8.3f} ms per example")
+
+
+# To score many batches, `net.plan(max_batch)` allocates the layer outputs once. Layer outputs alternate between two buffers, and the bias and activation are applied in place, so a call to the plan does not allocate new arrays. The returned array is a view of a buffer that the next call overwrites; pass `out=` to keep the results.
+
+# In[ ]:
+
+
+plan = net.plan(max_batch=250)
+Yhat_plan = np.empty((m, 1), dtype=np.float32)
+for start in range(0, m, 250):
+    Yhat_plan[start:start+250] = plan.predict(X[start:start+250])
+print(f"buffers: {plan.nbytes/1e3:.0f} kB, max difference to predict: {np.max(np.abs(Yhat_plan - net.predict(X))):.2e}")
+
+
+# The network can also be trained without Tensorflow. `MLP` in `lab_utils_nn.py` implements backpropagation for Dense layers in NumPy. It trains with mini-batches of 32 and the Adam optimizer, the same settings as `model.fit` above. For a network this small it avoids Tensorflow's overhead on every step.
+
+# In[ ]:
+
+
+from lab_utils_nn import MLP
+
+np_model = MLP(400, [(25, "sigmoid"), (15, "sigmoid"), (1, "sigmoid")], loss="binary_crossentropy", seed=1)
+tic = time.perf_counter()
+J_history = np_model.fit(X, y, num_epochs=20, alpha=0.001)
+print(f"trained in {time.perf_counter() - tic:.2f} s")
+print(f"training accuracy: {np.mean((np_model.predict(X) >= 0.5) == y):.3f}")
+
+
 # Run the following cell to see predictions. This will use the predictions we just calculated above. This takes a moment to run.
 
 # In[64]:
@@ -86,24 +86,20 @@ plt_act_trio()
 # UNQ_C1
 # GRADED CELL: my_softmax
 
-def my_softmax(z):  
+def my_softmax(z, axis=-1):  
     """ Softmax converts a vector of values to a probability distribution.
     Args:
-      z (ndarray (N,))  : input data, N features
+      z (ndarray (N,) or (m,N)) : input data, N features, or m examples of N features each
+      axis (int)                : axis the softmax is taken over, the last one by default
     Returns:
-      a (ndarray (N,))  : softmax of z
+      a (ndarray (N,) or (m,N)) : softmax of z
     """    
     ### START CODE HERE ### 
-    N = len(z)
-    a = np.zeros(N)
-    ez_sum = 0
-    for k in range(N):
-        ez_sum += np.exp(z[k])
-    for j in range(N):
-        a[j] = np.exp(z[j]) / ez_sum
-        
-  
-    
+    z = np.asarray(z)
+    # e^(z_j - c) / sum_k e^(z_k - c) equals a_j for any c. Shifting by the largest z
+    # keeps every exponent <= 0, so exp cannot overflow for large logits
+    ez = np.exp(z - np.max(z, axis=axis, keepdims=True))
+    a = ez / np.sum(ez, axis=axis, keepdims=True)
         
     ### END CODE HERE ### 
     return a
@@ -171,6 +167,22 @@ plt.close("all")
 plt_softmax(my_softmax)
 
 
+# Because `my_softmax` subtracts the largest input before taking the exponential, it does not overflow for large values, where `np.exp` alone would return `inf` (above about 709). It also computes the softmax of every row of an (m,N) matrix at once. When the logarithm of the probabilities is needed, for example in the cross-entropy loss, `log_softmax` and `softmax_cross_entropy` in `lab_utils_inference.py` compute it directly from the logits, without computing the probabilities. This stays finite for probabilities too small to represent. This is what `from_logits=True` does in Tensorflow (see section 4.5).
+
+# In[ ]:
+
+
+from lab_utils_inference import log_softmax, softmax_cross_entropy
+
+Z = np.array([[1., 2., 3., 4.],
+              [1000., 2., 3., -1000.]])
+labels = np.array([3, 3])
+print(f"my_softmax(Z):\n{my_softmax(Z)}")
+print(f"log_softmax(Z):\n{log_softmax(Z)}")
+print(f"softmax_cross_entropy: {softmax_cross_entropy(Z, labels)}")
+print(f"tensorflow:            {tf.keras.losses.sparse_categorical_crossentropy(labels, Z, from_logits=True).numpy()}")
+
+
 # <a name="4"></a>
 # ## 4 - Neural Networks
 # 
@@ -506,13 +518,14 @@ yhat = np.argmax(prediction_p)
 print(f"np.argmax(prediction_p): {yhat}")
 
 
-# Let's compare the predictions vs the labels for a random sample of 64 digits. This takes a moment to run.
+# Let's compare the predictions vs the labels for a random sample of 64 digits. The 64 images are predicted together with a single call of `model.predict`. The softmax is not needed to select the digit, since the largest output is also the largest probability.
 
 # In[22]:
 
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
+from lab_utils_inference import predict_labels
 # You do not need to modify anything in this cell
 
 m, n = X.shape
@@ -520,9 +533,13 @@ m, n = X.shape
 fig, axes = plt.subplots(8,8, figsize=(5,5))
 fig.tight_layout(pad=0.13,rect=[0, 0.03, 1, 0.91]) #[left, bottom, right, top]
 widgvis(fig)
+
+# Select random indices and predict them all at once using the Neural Network
+random_indices = np.random.randint(m, size=axes.size)
+yhat = predict_labels(model.predict, X, random_indices)
+
 for i,ax in enumerate(axes.flat):
-    # Select random indices
-    random_index = np.random.randint(m)
+    random_index = random_indices[i]
     
     # Select rows corresponding to the random indices and
     # reshape the image
@@ -531,13 +548,8 @@ for i,ax in enumerate(axes.flat):
     # Display the image
     ax.imshow(X_random_reshaped, cmap='gray')
     
-    # Predict using the Neural Network
-    prediction = model.predict(X[random_index].reshape(1,400))
-    prediction_p = tf.nn.softmax(prediction)
-    yhat = np.argmax(prediction_p)
-    
     # Display the label above the image
-    ax.set_title(f"{y[random_index,0]},{yhat}",fontsize=10)
+    ax.set_title(f"{y[random_index,0]},{yhat[i]}",fontsize=10)
     ax.set_axis_off()
 fig.suptitle("Label, yhat", fontsize=14)
 plt.show()
@@ -552,6 +564,22 @@ plt.show()
 print( f"{display_errors(model,X,y)} errors out of {len(X)} images")
 
 
+# The same network can be trained in NumPy with `MLP` from `lab_utils_nn.py`. It uses backpropagation with the same loss computed from the logits, mini-batches of 32 and Adam. `to_dense_model` returns the trained network as a `DenseModel` (`lab_utils_inference.py`), which predicts without Tensorflow.
+
+# In[ ]:
+
+
+import time
+from lab_utils_nn import MLP
+
+np_model = MLP(400, [(25, "relu"), (15, "relu"), (10, "linear")], loss="sparse_categorical_crossentropy", seed=1)
+tic = time.perf_counter()
+J_history = np_model.fit(X, y, num_epochs=40, alpha=0.001)
+print(f"trained in {time.perf_counter() - tic:.2f} s")
+yhat = np.argmax(np_model.to_dense_model().predict(X), axis=1)
+print(f"{np.sum(yhat != y[:,0])} errors out of {len(X)} images")
+
+
 # ### Congratulations!
 # You have successfully built and utilized a neural network to do multiclass classification.
 
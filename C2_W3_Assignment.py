@@ -61,7 +61,10 @@ logging.getLogger("tensorflow").setLevel(logging.ERROR)
 
 from public_tests_a1 import * 
 
-tf.keras.backend.set_floatx('float64')
+# one dtype policy for Keras and the NumPy helpers, set to 'float32' to halve memory traffic
+from lab_utils_precision import set_floatx, floatx
+set_floatx('float64')
+tf.keras.backend.set_floatx(floatx().name)
 from assigment_utils import *
 
 tf.autograph.set_verbosity(0)
@@ -373,6 +376,37 @@ plt_tune_regularization(X_train, y_train, X_cv, y_cv, x, y_pred, err_train, err_
 
 # Above, the plots show that as regularization increases, the model moves from a high variance (overfitting) model to a high bias (underfitting) model. The vertical line in the right plot shows the optimal value of lambda. In this example, the polynomial degree was set to 10. 
 
+# Each model in the two sweeps above is trained independently of the others, so they can be trained at the same time on different CPU cores. `parallel_sweep` in `lab_utils_sweep.py` runs one fit per setting in a pool of worker processes. The training and cross-validation sets are copied into shared memory once and every worker reads them from there, instead of receiving its own pickled copy with each task. The fit function below is defined in the notebook, so the workers must be started with `fork`, which copies the notebook's functions into them. Where `fork` is not available (Windows), the cell runs the same sweeps one after the other with `serial_sweep`; to run them in parallel there, move the fit function to a `.py` file and import it.
+
+# In[ ]:
+
+
+import multiprocessing
+from lab_utils_sweep import parallel_sweep, serial_sweep, format_table
+
+def fit_lin_model(X_train, y_train, X_cv, y_cv, x, degree, lambda_=None):
+    if lambda_ is None:
+        lmodel = lin_model(degree)
+    else:
+        lmodel = lin_model(degree, regularization=True, lambda_=lambda_)
+    lmodel.fit(X_train, y_train)
+    return {"err_train": lmodel.mse(y_train, lmodel.predict(X_train)),
+            "err_cv": lmodel.mse(y_cv, lmodel.predict(X_cv)),
+            "y_pred": lmodel.predict(x)}
+
+arrays = {"X_train": X_train, "y_train": y_train, "X_cv": X_cv, "y_cv": y_cv, "x": x}
+if "fork" in multiprocessing.get_all_start_methods():
+    sweep = lambda grid: parallel_sweep(fit_lin_model, grid, arrays, mp_context="fork")
+else:
+    sweep = lambda grid: serial_sweep(fit_lin_model, grid, arrays)
+degree_results = sweep([{"degree": d + 1} for d in range(max_degree)])
+lambda_results = sweep([{"degree": degree, "lambda_": l} for l in lambda_range])
+print(format_table(degree_results, ["degree", "err_train", "err_cv", "time"]))
+print(format_table(lambda_results, ["lambda_", "err_train", "err_cv", "time"]))
+print("optimal degree:", degree_results[np.argmin([r["err_cv"] for r in degree_results])]["degree"],
+      " optimal lambda:", lambda_results[np.argmin([r["err_cv"] for r in lambda_results])]["lambda_"])
+
+
 # <a name="3.4"></a>
 # ### 3.4 Getting more data: Increasing Training Set Size (m)
 # When a model is overfitting (high variance), collecting additional data can improve performance. Let's try that here.
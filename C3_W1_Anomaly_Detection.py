@@ -36,6 +36,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from utils import *
+from lab_utils_precision import cast, cast_data, reduce_sum
 
 get_ipython().run_line_magic('matplotlib', 'inline')
 
@@ -205,8 +206,11 @@ def estimate_gaussian(X):
     
     ### START CODE HERE ### 
     
-    mu = 1 / m * np.sum(X, axis = 0)
-    var = 1 / m * np.sum((X - mu) ** 2, axis = 0)
+    # X keeps its float dtype (lab_utils_precision), the sums are accumulated in the
+    # accumulation dtype and returned in floatx
+    X = cast_data(X)
+    mu = 1 / m * reduce_sum(X, axis = 0)
+    var = 1 / m * reduce_sum((X - cast(mu, X.dtype)) ** 2, axis = 0)
     
     ### END CODE HERE ### 
         
@@ -34,6 +34,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from utils import *
+from lab_utils_precision import cast_data, floatx, reduce_mean
 
 get_ipython().run_line_magic('matplotlib', 'inline')
 
@@ -303,14 +304,15 @@ def compute_centroids(X, idx, K):
     m, n = X.shape
     
     # You need to return the following variables correctly
-    centroids = np.zeros((K, n))
+    X = cast_data(X)   # float data is used as it is, without a copy
+    centroids = np.zeros((K, n), dtype=floatx())
     
     ### START CODE HERE ###
  
     for k in range(K):
         
         points = X[idx == k]
-        centroids[k] = np.mean(points, axis = 0)
+        centroids[k] = reduce_mean(points, axis = 0)
         
     ### END CODE HERE ## 
     
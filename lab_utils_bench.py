@@ -0,0 +1,453 @@
+"""
+lab_utils_bench.py
+    Benchmarks the graded functions of the notebooks across input sizes. For each
+    function it records the time per call, the throughput in examples per second and
+    the peak memory allocated, and checks that the loop and vectorized versions of the
+    same computation agree. The results are written to a JSON file, so runs on different
+    versions or machines can be compared.
+
+    The functions are read from the notebook exports with ast and only their definitions
+    are executed, so the notebooks' own helper modules and data are not needed.
+    Implementations that need tensorflow are skipped when it is not installed.
+
+    Every graded function of the notebooks has a case, except for these graded cells:
+      - the Keras model definitions: the Sequential models of C2_W1 and C2_W2, model,
+        model_s and model_r of C2_W3, the user and item networks of C3_W2_RecSysNN
+        and the Q-network of C3_W3. They are not functions of arrays, and their cost
+        is that of model.fit.
+      - compute_loss of C3_W3, which runs the Keras Q-networks and needs tensorflow.
+
+    Usage:
+        python lab_utils_bench.py --sizes 100 1000 10000 --out bench_results.json
+"""
+import argparse
+import ast
+import copy
+import datetime
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+import numpy as np
+import lab_utils_precision
+import lab_utils_sparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_functions(notebook, names, namespace=None):
+    """
+    Executes the definitions of the named functions from a notebook export,
+    without running any of its cells
+    Args:
+      notebook (str)   : file name of the notebook export, e.g. "C2_W1_Assignment.py"
+      names (list)     : names of the functions to load
+      namespace (dict) : globals the functions see, a default one is created if None
+    Returns:
+      namespace (dict) : namespace holding the loaded functions
+    """
+    if namespace is None:
+        namespace = base_namespace()
+    with open(os.path.join(HERE, notebook), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    found = set()
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in names:
+            exec(compile(ast.Module([node], type_ignores=[]), notebook, "exec"), namespace)
+            found.add(node.name)
+    missing = set(names) - found
+    if missing:
+        raise ValueError(f"{notebook} does not define {sorted(missing)}")
+    return namespace
+
+
+def sigmoid(z):
+    """ NumPy sigmoid, stands in for the activation the notebooks import """
+    return 1 / (1 + np.exp(-z))
+
+
+def base_namespace():
+    """ Globals for the loaded functions: numpy, the lab_utils helpers and tensorflow if present """
+    namespace = {"np": np, "math": math, "copy": copy, "sigmoid": sigmoid}
+    for module in (lab_utils_precision, lab_utils_sparse):
+        namespace.update({k: getattr(module, k) for k in dir(module) if not k.startswith("_")})
+    try:
+        import tensorflow as tf
+        namespace["tf"] = tf
+    except ImportError:
+        pass
+    return namespace
+
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+def time_function(function, args, repeat=3, min_time=0.05):
+    """
+    Best time per call in seconds. Like timeit, the function is called enough times in a
+    row for the total to exceed min_time, and the best of `repeat` such runs is kept.
+    """
+    number = 1
+    while True:
+        tic = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        elapsed = time.perf_counter() - tic
+        if elapsed >= min_time:
+            break
+        number *= 10
+    best = elapsed
+    for _ in range(repeat - 1):
+        tic = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        best = min(best, time.perf_counter() - tic)
+    return best / number
+
+
+def peak_memory(function, args):
+    """ Peak memory in bytes allocated by one call, as seen by tracemalloc (NumPy included) """
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def max_rel_error(reference, result):
+    """ Largest difference between two outputs, relative to the largest reference value """
+    if not isinstance(reference, tuple):
+        reference, result = (reference,), (result,)
+    err = 0.
+    for ref, res in zip(reference, result):
+        ref = np.asarray(ref, dtype=np.float64)
+        res = np.asarray(res, dtype=np.float64).reshape(ref.shape)
+        scale = max(float(np.max(np.abs(ref))), np.finfo(np.float64).tiny)
+        err = max(err, float(np.max(np.abs(res - ref))) / scale)
+    return err
+
+
+# ---------------------------------------------------------------------------
+# Cases
+#
+# A case groups the implementations of one computation. Its setup function takes the
+# loaded namespace, a size m and a random generator and returns {name: (function, args)}.
+# The first implementation is the reference the others are checked against.
+# ---------------------------------------------------------------------------
+
+def _linear_cost(ns, m, rng):
+    x = rng.uniform(5, 22, m)
+    y = 1.2 * x - 4 + rng.normal(0, 3, m)
+    return {"compute_cost": (ns["compute_cost"], (x, y, 1.1, -3.)),
+            "compute_cost_v": (ns["compute_cost_v"], (x, y, 1.1, -3.))}
+
+
+def _linear_gradient(ns, m, rng):
+    x = rng.uniform(5, 22, m)
+    y = 1.2 * x - 4 + rng.normal(0, 3, m)
+    return {"compute_gradient": (ns["compute_gradient"], (x, y, 1.1, -3.)),
+            "compute_gradient_v": (ns["compute_gradient_v"], (x, y, 1.1, -3.))}
+
+
+def _logistic(ns, m, rng):
+    X = rng.normal(size=(m, 27))
+    y = (rng.random(m) < 0.5).astype(float)
+    w = rng.normal(size=27) * 0.1
+
+    def separate(X, y, w, b, lambda_):
+        dj_db, dj_dw = ns["compute_gradient_reg"](X, y, w, b, lambda_)
+        return ns["compute_cost_reg"](X, y, w, b, lambda_), dj_db, dj_dw
+    return {"compute_cost_reg + compute_gradient_reg": (separate, (X, y, w, 0.5, 1.)),
+            "compute_cost_gradient_reg": (ns["compute_cost_gradient_reg"], (X, y, w, 0.5, 1.))}
+
+
+def _dense(ns, m, rng):
+    X = rng.normal(size=(m, 400))
+    W = rng.normal(size=(400, 25)) * 0.05
+    b = rng.normal(size=25)
+
+    def loop(X, W, b):
+        return np.array([ns["my_dense"](x, W, b, sigmoid) for x in X])
+    return {"my_dense": (loop, (X, W, b)),
+            "my_dense_v": (lambda X, W, b: ns["my_dense_v"](X, W, b.reshape(1, -1), sigmoid), (X, W, b))}
+
+
+def _sequential(ns, m, rng):
+    X = rng.normal(size=(m, 400))
+    shapes = [(400, 25), (25, 15), (15, 1)]
+    params = []
+    for n_in, n_out in shapes:
+        params += [rng.normal(size=(n_in, n_out)) / math.sqrt(n_in), rng.normal(size=n_out)]
+
+    def loop(X, *params):
+        return np.array([ns["my_sequential"](x, *params) for x in X])
+
+    def vectorized(X, W1, b1, W2, b2, W3, b3):
+        return ns["my_sequential_v"](X, W1, b1.reshape(1, -1), W2, b2.reshape(1, -1), W3, b3.reshape(1, -1))
+    return {"my_sequential": (loop, (X, *params)), "my_sequential_v": (vectorized, (X, *params))}
+
+
+def _logistic_predict(ns, m, rng):
+    X = rng.normal(size=(m, 27))
+    w = rng.normal(size=27) * 0.1
+    return {"predict": (ns["predict"], (X, w, 0.5)),
+            "predict_proba >= 0.5": (lambda X, w, b: ns["predict_proba"](X, w, b) >= 0.5, (X, w, 0.5))}
+
+
+def _logistic_proba(ns, m, rng):
+    X = rng.normal(size=(m, 27))
+    w = rng.normal(size=27) * 0.1
+    return {"sigmoid(X @ w + b)": (lambda X, w, b: sigmoid(X @ w + b), (X, w, 0.5)),
+            "predict_proba": (ns["predict_proba"], (X, w, 0.5))}
+
+
+def _softmax(ns, m, rng):
+    Z = rng.normal(size=(m, 10)) * 5
+
+    def loop(Z):
+        return np.array([ns["my_softmax"](z) for z in Z])
+    return {"my_softmax per example": (loop, (Z,)), "my_softmax": (ns["my_softmax"], (Z,))}
+
+
+def _eval_mse(ns, m, rng):
+    y = rng.normal(size=m)
+    yhat = y + rng.normal(0, 0.5, m)
+    return {"eval_mse": (ns["eval_mse"], (y, yhat)),
+            "np.mean": (lambda y, yhat: np.mean(np.square(yhat - y)) / 2, (y, yhat))}
+
+
+def _eval_cat_err(ns, m, rng):
+    y = rng.integers(0, 6, m)
+    yhat = np.where(rng.random(m) < 0.2, rng.integers(0, 6, m), y)
+    return {"eval_cat_err": (ns["eval_cat_err"], (y, yhat)),
+            "np.mean": (lambda y, yhat: np.mean(yhat != y), (y, yhat))}
+
+
+def _tree_data(m, rng):
+    # the one-hot mushroom features of C2_W4, 3 binary features and an edible label
+    X = rng.integers(0, 2, size=(m, 3))
+    y = (X[:, 0] ^ (rng.random(m) < 0.2)).astype(int)
+    return X, y, list(range(m))
+
+
+def _entropy(ns, m, rng):
+    _, y, _ = _tree_data(m, rng)
+    return {"compute_entropy": (ns["compute_entropy"], (y,))}
+
+
+def _split(ns, m, rng):
+    X, _, node_indices = _tree_data(m, rng)
+    return {"split_dataset": (ns["split_dataset"], (X, node_indices, 0))}
+
+
+def _information_gain(ns, m, rng):
+    X, y, node_indices = _tree_data(m, rng)
+    return {"compute_information_gain": (ns["compute_information_gain"], (X, y, node_indices, 0))}
+
+
+def _best_split(ns, m, rng):
+    X, y, node_indices = _tree_data(m, rng)
+    return {"get_best_split": (ns["get_best_split"], (X, y, node_indices))}
+
+
+def _sq_dist(ns, m, rng):
+    # distances from m item vectors to 50 others, as in the movie similarity table of C3_W2
+    A = rng.normal(size=(m, 32))
+    B = rng.normal(size=(50, 32))
+
+    def loop(A, B):
+        return np.array([[ns["sq_dist"](a, b) for b in B] for a in A])
+
+    def vectorized(A, B):
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, one matrix product for all the pairs
+        D = A @ B.T
+        D *= -2
+        D += np.einsum('ij,ij->i', A, A)[:, np.newaxis]
+        D += np.einsum('ij,ij->i', B, B)
+        return D
+    return {"sq_dist": (loop, (A, B)), "matrix product": (vectorized, (A, B))}
+
+
+def _cofi(ns, m, rng):
+    num_users, num_features = 50, 10
+    X = rng.normal(size=(m, num_features))
+    W = rng.normal(size=(num_users, num_features))
+    b = rng.normal(size=(1, num_users))
+    Y = rng.integers(0, 6, size=(m, num_users)).astype(float)
+    R = (rng.random((m, num_users)) < 0.2).astype(float)
+    impls = {"cofi_cost_func": (ns["cofi_cost_func"], (X, W, b, Y, R, 1.5))}
+    if "tf" in ns:
+        impls["cofi_cost_func_v"] = (ns["cofi_cost_func_v"], (X, W, b, Y, R, 1.5))
+    return impls
+
+
+def _estimate_gaussian(ns, m, rng):
+    X = rng.normal(size=(m, 11))
+    return {"estimate_gaussian": (ns["estimate_gaussian"], (X,))}
+
+
+def _select_threshold(ns, m, rng):
+    y_val = (rng.random(m) < 0.05).astype(int)
+    p_val = np.where(y_val == 1, rng.uniform(0, 0.02, m), rng.uniform(0.01, 0.2, m))
+
+    def select_threshold(y_val, p_val):
+        # epsilons below every p_val flag no example, and the precision is 0/0 there
+        with np.errstate(invalid="ignore"):
+            return ns["select_threshold"](y_val, p_val)
+    return {"select_threshold": (select_threshold, (y_val, p_val))}
+
+
+def _kmeans(ns, m, rng):
+    X = rng.normal(size=(m, 3))
+    centroids = rng.normal(size=(16, 3))
+    return {"find_closest_centroids": (ns["find_closest_centroids"], (X, centroids))}
+
+
+def _centroids(ns, m, rng):
+    X = rng.normal(size=(m, 3))
+    idx = rng.integers(0, 16, m)
+    return {"compute_centroids": (ns["compute_centroids"], (X, idx, 16))}
+
+
+CASES = [
+    {"name": "linear cost", "notebook": "C1_W2_Linear_Regression.py",
+     "functions": ["compute_cost", "compute_cost_gradient", "compute_cost_v"], "setup": _linear_cost},
+    {"name": "linear gradient", "notebook": "C1_W2_Linear_Regression.py",
+     "functions": ["compute_gradient", "compute_cost_gradient", "compute_gradient_v"], "setup": _linear_gradient},
+    {"name": "logistic cost and gradient", "notebook": "C1_W3_Logistic_Regression.py",
+     "functions": ["sigmoid", "compute_cost", "compute_cost_reg", "compute_gradient_reg",
+                   "compute_cost_gradient", "compute_cost_gradient_reg"], "setup": _logistic},
+    {"name": "logistic prediction", "notebook": "C1_W3_Logistic_Regression.py",
+     "functions": ["predict", "predict_proba"], "setup": _logistic_predict},
+    {"name": "logistic probabilities", "notebook": "C1_W3_Logistic_Regression.py",
+     "functions": ["predict_proba"], "setup": _logistic_proba},
+    {"name": "dense layer", "notebook": "C2_W1_Assignment.py",
+     "functions": ["my_dense", "my_dense_v"], "setup": _dense},
+    {"name": "sequential model", "notebook": "C2_W1_Assignment.py",
+     "functions": ["my_dense", "my_dense_v", "my_sequential", "my_sequential_v"], "setup": _sequential},
+    {"name": "softmax", "notebook": "C2_W2_Assignment.py",
+     "functions": ["my_softmax"], "setup": _softmax},
+    {"name": "mean squared error", "notebook": "C2_W3_Assignment.py",
+     "functions": ["eval_mse"], "setup": _eval_mse},
+    {"name": "categorization error", "notebook": "C2_W3_Assignment.py",
+     "functions": ["eval_cat_err"], "setup": _eval_cat_err},
+    {"name": "entropy", "notebook": "C2_W4_Decision_Tree_with_Markdown.py",
+     "functions": ["compute_entropy"], "setup": _entropy},
+    {"name": "dataset split", "notebook": "C2_W4_Decision_Tree_with_Markdown.py",
+     "functions": ["split_dataset"], "setup": _split},
+    {"name": "information gain", "notebook": "C2_W4_Decision_Tree_with_Markdown.py",
+     "functions": ["compute_entropy", "split_dataset", "compute_information_gain"],
+     "setup": _information_gain},
+    {"name": "best split", "notebook": "C2_W4_Decision_Tree_with_Markdown.py",
+     "functions": ["compute_entropy", "split_dataset", "compute_information_gain", "get_best_split"],
+     "setup": _best_split},
+    {"name": "collaborative filtering cost", "notebook": "C3_W2_Collaborative_RecSys_Assignment.py",
+     "functions": ["cofi_cost_func", "cofi_cost_func_v"], "setup": _cofi},
+    {"name": "squared distance", "notebook": "C3_W2_RecSysNN_Assignment.py",
+     "functions": ["sq_dist"], "setup": _sq_dist},
+    {"name": "gaussian estimate", "notebook": "C3_W1_Anomaly_Detection.py",
+     "functions": ["estimate_gaussian"], "setup": _estimate_gaussian},
+    {"name": "threshold selection", "notebook": "C3_W1_Anomaly_Detection.py",
+     "functions": ["select_threshold"], "setup": _select_threshold},
+    {"name": "closest centroids", "notebook": "C3_W1_KMeans_Assignment.py",
+     "functions": ["find_closest_centroids"], "setup": _kmeans},
+    {"name": "centroid update", "notebook": "C3_W1_KMeans_Assignment.py",
+     "functions": ["compute_centroids"], "setup": _centroids},
+]
+
+
+def run_benchmarks(sizes=(100, 1000, 10000), repeat=3, max_seconds=2., cases=None, seed=0, verbose=True):
+    """
+    Runs the benchmark cases
+    Args:
+      sizes (tuple)      : numbers of examples m to run each case with
+      repeat (int)       : timing runs per measurement, the best is kept
+      max_seconds (float): an implementation whose single call takes longer than this
+                           is not run at the larger sizes
+      cases (list)       : names of the cases to run, all if None
+      seed (int)         : seed of the random inputs
+      verbose (bool)     : print a line per measurement
+    Returns:
+      records (list): one dict per case, implementation and size with the keys case,
+                      implementation, m, seconds, examples_per_second, peak_bytes,
+                      max_rel_error (vs. the first implementation) and status
+    """
+    records = []
+    for case in CASES:
+        if cases is not None and case["name"] not in cases:
+            continue
+        ns = load_functions(case["notebook"], case["functions"])
+        too_slow = set()
+        for m in sizes:
+            impls = case["setup"](ns, m, np.random.default_rng(seed))
+            reference = None
+            for name, (function, args) in impls.items():
+                record = {"case": case["name"], "implementation": name, "m": m}
+                if name in too_slow:
+                    record["status"] = f"skipped, slower than {max_seconds} s per call at a smaller size"
+                    records.append(record)
+                    continue
+                tic = time.perf_counter()
+                result = function(*args)
+                if time.perf_counter() - tic > max_seconds:
+                    too_slow.add(name)
+                if reference is None:
+                    reference = result
+                seconds = time_function(function, args, repeat)
+                record.update(seconds=seconds, examples_per_second=m / seconds,
+                              peak_bytes=peak_memory(function, args),
+                              max_rel_error=max_rel_error(reference, result), status="ok")
+                records.append(record)
+                if verbose:
+                    print(f"{case['name']:30} {name:40} m={m:<8} {seconds * 1e3:10.3f} ms "
+                          f"{record['peak_bytes'] / 1e6:9.2f} MB  rel. err {record['max_rel_error']:.1e}")
+    return records
+
+
+def fastest(records):
+    """ Returns {case: {m: name of the fastest implementation}} """
+    best = {}
+    for r in records:
+        if r["status"] != "ok":
+            continue
+        current = best.setdefault(r["case"], {}).get(r["m"])
+        if current is None or r["seconds"] < current[1]:
+            best[r["case"]][r["m"]] = (r["implementation"], r["seconds"])
+    return {case: {m: name for m, (name, _) in by_size.items()} for case, by_size in best.items()}
+
+
+def write_results(records, file):
+    """ Writes the records, the fastest implementation per size and the environment to a JSON file """
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "records": records,
+        "fastest": {case: {str(m): name for m, name in by_size.items()}
+                    for case, by_size in fastest(records).items()},
+    }
+    with open(file, "w") as f:
+        json.dump(results, f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the graded functions of the notebooks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=2.)
+    parser.add_argument("--cases", nargs="+", help="names of the cases to run, all by default")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    records = run_benchmarks(args.sizes, args.repeat, args.max_seconds, args.cases)
+    write_results(records, args.out)
+    print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
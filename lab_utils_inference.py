@@ -0,0 +1,286 @@
+"""
+lab_utils_inference.py
+    Runs trained Sequential models of Dense layers with NumPy only, the way my_dense_v and
+    my_sequential_v do in C2_W1. The weights and activations are copied from a Keras model
+    once, with DenseModel.from_keras, and can be saved to a .npz file. Loading that file and
+    predicting only needs NumPy, so a scoring process does not import tensorflow.
+
+    Usage:
+        DenseModel.from_keras(model).save("digits.npz")      # where tensorflow is available
+        ...
+        net = DenseModel.load("digits.npz")                  # NumPy only
+        yhat = net.predict(X) >= 0.5
+
+    log_softmax and softmax_cross_entropy compute the softmax log-probabilities and loss
+    from the logits, for output layers with a linear activation.
+
+    For a scoring loop over many batches, net.plan(max_batch) returns an InferencePlan
+    that computes the layers in preallocated buffers, so a call allocates no arrays.
+"""
+import numpy as np
+from lab_utils_precision import floatx
+
+
+# Activations work in place on the layer output Z (m,j), which belongs to the layer, and
+# return it. `rows` is an optional (m,1) scratch array for the row reductions of softmax;
+# with it, no activation allocates any array.
+
+def linear(z, rows=None):
+    return z
+
+
+def relu(z, rows=None):
+    return np.maximum(z, 0, out=z)
+
+
+def sigmoid(z, rows=None):
+    # 1/(1+exp(-z)); exp overflows to inf for z < -709, which correctly gives 0
+    with np.errstate(over='ignore'):
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+    z += 1
+    return np.reciprocal(z, out=z)
+
+
+def tanh(z, rows=None):
+    return np.tanh(z, out=z)
+
+
+def softmax(z, rows=None):
+    # softmax of each row, shifted by the row maximum so exp cannot overflow
+    rows = np.max(z, axis=-1, keepdims=True, out=rows)
+    z -= rows
+    np.exp(z, out=z)
+    z /= np.sum(z, axis=-1, keepdims=True, out=rows)
+    return z
+
+
+ACTIVATIONS = {"linear": linear, "relu": relu, "sigmoid": sigmoid, "tanh": tanh, "softmax": softmax}
+
+
+def log_softmax(z, axis=-1):
+    """
+    Log of the softmax of z along axis, computed as z - logsumexp(z) so it stays finite
+    where the softmax underflows to 0
+    Args:
+      z (ndarray (m,K) or (K,)): logits
+      axis (int)               : axis the softmax is taken over
+    Returns:
+      log_a (ndarray like z)   : log softmax(z)
+    """
+    z = np.asarray(z)
+    shifted = z - np.max(z, axis=axis, keepdims=True)
+    return shifted - np.log(np.sum(np.exp(shifted), axis=axis, keepdims=True))
+
+
+def softmax_cross_entropy(z, y):
+    """
+    Cross-entropy loss of softmax(z) for integer labels, the loss of
+    SparseCategoricalCrossentropy(from_logits=True), without computing the probabilities:
+    loss_i = logsumexp(z_i) - z_i[y_i]
+    Args:
+      z (ndarray (m,K))    : logits, m examples of K classes
+      y (array_like (m,))  : labels in 0..K-1, (m,1) is accepted too
+    Returns:
+      loss (ndarray (m,))  : loss of each example, take the mean for the cost
+    """
+    z = np.asarray(z)
+    y = np.asarray(y).reshape(-1)
+    z_max = np.max(z, axis=1)
+    lse = z_max + np.log(np.sum(np.exp(z - z_max[:, np.newaxis]), axis=1))
+    return lse - z[np.arange(z.shape[0]), y]
+
+
+# Keras layers that do nothing at inference time, which from_keras skips
+INFERENCE_NOOP_LAYERS = ("InputLayer", "Dropout")
+
+
+class DenseModel:
+    """
+    A stack of Dense layers evaluated with NumPy
+    Args:
+      layers (list): one (W, b, activation) tuple per layer, with W (ndarray (n,j)),
+                     b (ndarray (j,)) and activation the name of one of ACTIVATIONS
+      dtype        : dtype the model computes in, floatx of lab_utils_precision if None
+    """
+    def __init__(self, layers, dtype=None):
+        self.dtype = floatx() if dtype is None else np.dtype(dtype)
+        self.weights = []
+        self.biases = []
+        self.activations = []
+        for W, b, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"unsupported activation {activation!r}, use one of {list(ACTIVATIONS)}")
+            W = np.ascontiguousarray(W, dtype=self.dtype)
+            self.weights.append(W)
+            self.biases.append(np.asarray(b, dtype=self.dtype).reshape(W.shape[1]))
+            self.activations.append(activation)
+
+    @classmethod
+    def from_keras(cls, model, dtype=None):
+        """
+        Copies the Dense layers of a trained Keras Sequential model. InputLayer and Dropout
+        are skipped, any other layer raises a ValueError
+        Args:
+          model : tf.keras Sequential model of Dense layers
+          dtype : dtype the model computes in, floatx of lab_utils_precision if None
+        Returns:
+          DenseModel
+        """
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind in INFERENCE_NOOP_LAYERS:
+                continue
+            # any other layer changes the output, with or without weights (e.g. Activation,
+            # Flatten, Rescaling), so dropping it would give wrong predictions
+            if kind != "Dense":
+                raise ValueError(f"layer {layer.name} is a {kind}, only Dense layers are supported")
+            config = layer.get_config()
+            weights = layer.get_weights()
+            W = weights[0]
+            b = weights[1] if config.get("use_bias", True) else np.zeros(W.shape[1], dtype=W.dtype)
+            layers.append((W, b, config["activation"]))
+        return cls(layers, dtype)
+
+    def save(self, file):
+        """ Saves the weights and activations to an uncompressed .npz file """
+        arrays = {"activations": np.array(self.activations)}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"W{i}"] = W
+            arrays[f"b{i}"] = b
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, file, dtype=None):
+        """ Loads a model written by save """
+        with np.load(file, allow_pickle=False) as data:
+            activations = [str(a) for a in data["activations"]]
+            layers = [(data[f"W{i}"], data[f"b{i}"], a) for i, a in enumerate(activations)]
+        return cls(layers, dtype)
+
+    @property
+    def n_features(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def n_outputs(self):
+        return self.weights[-1].shape[1]
+
+    def predict(self, X):
+        """
+        Computes the model output
+        Args:
+          X (ndarray (m,n) or (n,)): m examples, n features each. A single example
+                                     can be passed as a vector
+        Returns:
+          A (ndarray (m,k)): output of the last layer, (1,k) for a single example
+        """
+        A = np.asarray(X, dtype=self.dtype)
+        if A.ndim == 1:
+            A = A.reshape(1, -1)
+        for W, b, activation in zip(self.weights, self.biases, self.activations):
+            Z = np.matmul(A, W)
+            Z += b
+            A = ACTIVATIONS[activation](Z)
+        return A
+
+    __call__ = predict
+
+    def plan(self, max_batch):
+        """ Returns an InferencePlan for batches of up to max_batch examples """
+        return InferencePlan(self, max_batch)
+
+    def __repr__(self):
+        shapes = " -> ".join([str(self.n_features)] + [f"{W.shape[1]} {a}"
+                             for W, a in zip(self.weights, self.activations)])
+        return f"DenseModel({shapes}, {self.dtype})"
+
+
+def predict_labels(predict, X, indices, threshold=0.5):
+    """
+    Predicts the labels of the examples X[indices] with one call of the model
+    Args:
+      predict (function): model, called as predict(X) on an (m,n) batch, e.g. model.predict,
+                          DenseModel.predict or a lambda around my_sequential_v
+      X (ndarray (m,n)) : examples
+      indices (array_like (k,)): indices of the examples to predict
+      threshold (float) : threshold on the probability for a single output unit
+    Returns:
+      yhat (ndarray (k,)): label of X[indices[i]] in entry i. For one output unit, 1 if the
+                           output is >= threshold, else 0. For several, the index of the
+                           largest output (softmax does not change it, so logits work too)
+    """
+    P = np.asarray(predict(X[np.asarray(indices)]))
+    if P.shape[-1] == 1:
+        return (P[:, 0] >= threshold).astype(int)
+    return np.argmax(P, axis=-1)
+
+
+class InferencePlan:
+    """
+    Evaluates a DenseModel in buffers allocated once for batches of up to max_batch
+    examples. The layers alternate between two activation buffers (ping-pong): layer i
+    reads the output of layer i-1 from one buffer and writes its own into the other, and
+    the bias and the activation are applied in place, so predict allocates no arrays
+    (NumPy's fixed-size ufunc buffer for the broadcast bias add aside).
+    Args:
+      model (DenseModel): the model to evaluate
+      max_batch (int)   : largest number of examples computed at once
+    """
+    def __init__(self, model, max_batch):
+        self.model = model
+        self.max_batch = max_batch
+        width = max(W.shape[1] for W in model.weights)
+        self._buffers = (np.empty(max_batch * width, dtype=model.dtype),
+                         np.empty(max_batch * width, dtype=model.dtype))
+        self._rows = np.empty((max_batch, 1), dtype=model.dtype)
+        # input rows of another dtype are converted here instead of in a new array
+        self._input = np.empty((max_batch, model.n_features), dtype=model.dtype)
+        self._layers = [(W, b, ACTIVATIONS[a]) for W, b, a in
+                        zip(model.weights, model.biases, model.activations)]
+
+    @property
+    def nbytes(self):
+        """ Memory held by the buffers, in bytes """
+        return sum(a.nbytes for a in self._buffers) + self._rows.nbytes + self._input.nbytes
+
+    def _forward(self, X):
+        m = X.shape[0]
+        A = X
+        if A.dtype != self.model.dtype:
+            A = self._input[:m]
+            A[...] = X
+        for i, (W, b, activation) in enumerate(self._layers):
+            Z = self._buffers[i % 2][:m * W.shape[1]].reshape(m, W.shape[1])
+            np.matmul(A, W, out=Z)
+            Z += b
+            A = activation(Z, self._rows[:m])
+        return A
+
+    def predict(self, X, out=None):
+        """
+        Computes the model output
+        Args:
+          X (ndarray (m,n)) : m examples, n features each. Batches larger than max_batch
+                              are computed max_batch rows at a time
+          out (ndarray (m,k)): optional array the output is written into
+        Returns:
+          A (ndarray (m,k)): output of the last layer. Without out and for m <= max_batch
+                             this is a view of a buffer of the plan, which the next call
+                             overwrites: copy it to keep it
+        """
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        m = X.shape[0]
+        if out is None:
+            if m <= self.max_batch:
+                return self._forward(X)
+            out = np.empty((m, self.model.n_outputs), dtype=self.model.dtype)
+        for start in range(0, m, self.max_batch):
+            stop = min(start + self.max_batch, m)
+            out[start:stop] = self._forward(X[start:stop])
+        return out
+
+    __call__ = predict
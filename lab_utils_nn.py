@@ -0,0 +1,218 @@
+"""
+lab_utils_nn.py
+    Trains the Dense networks of the C2 labs with NumPy only: forward propagation,
+    vectorized backpropagation, mini-batches and the optimizers of lab_utils_train
+    (Adam by default, as in the labs' model.compile). Tensorflow is not needed.
+    A trained network converts to a lab_utils_inference.DenseModel for prediction.
+
+    Usage, the network of C2_W2:
+        net = MLP(400, [(25, "relu"), (15, "relu"), (10, "linear")],
+                  loss="sparse_categorical_crossentropy")
+        J_history = net.fit(X, y, num_epochs=40)
+        yhat = np.argmax(net.predict(X), axis=1)
+"""
+import math
+import numpy as np
+from lab_utils_precision import floatx
+from lab_utils_train import Adam, CostHistory, array_batches
+from lab_utils_inference import ACTIVATIONS, DenseModel, log_softmax, sigmoid
+
+
+# Derivative g'(z) of the hidden layer activations, written in terms of a = g(z) and
+# multiplied into dA in place, which turns dA into dZ.
+
+def _sigmoid_backward(dA, A):
+    dA *= A
+    dA *= 1 - A
+    return dA
+
+
+def _relu_backward(dA, A):
+    dA[A <= 0] = 0
+    return dA
+
+
+def _tanh_backward(dA, A):
+    dA *= 1 - np.square(A)
+    return dA
+
+
+def _linear_backward(dA, A):
+    return dA
+
+
+BACKWARD = {"sigmoid": _sigmoid_backward, "relu": _relu_backward, "tanh": _tanh_backward,
+            "linear": _linear_backward}
+
+# activations the output layer may have for each loss. The loss is always computed from
+# the output z (the logits), which is exact and stable for both choices
+LOSSES = {"binary_crossentropy": ("sigmoid", "linear"),
+          "sparse_categorical_crossentropy": ("softmax", "linear")}
+
+
+class MLP:
+    """
+    A network of Dense layers trained with NumPy
+    Args:
+      n_features (int): number of input features
+      layers (list)   : one (units, activation) tuple per layer. Hidden layers can use
+                        sigmoid, relu, tanh or linear
+      loss (str)      : "binary_crossentropy" for one output unit with a sigmoid (or linear,
+                        i.e. from_logits=True) activation, or "sparse_categorical_crossentropy"
+                        for K output units with a softmax (or linear) activation and
+                        integer labels 0..K-1
+      seed (int)      : seed of the initial weights
+      dtype           : dtype the network computes in, floatx of lab_utils_precision if None
+    """
+    def __init__(self, n_features, layers, loss="binary_crossentropy", seed=None, dtype=None):
+        if loss not in LOSSES:
+            raise ValueError(f"unsupported loss {loss!r}, use one of {list(LOSSES)}")
+        for _, activation in layers[:-1]:
+            if activation not in BACKWARD:
+                raise ValueError(f"unsupported hidden activation {activation!r}, use one of {list(BACKWARD)}")
+        if layers[-1][1] not in LOSSES[loss]:
+            raise ValueError(f"the output activation of {loss} must be one of {LOSSES[loss]}")
+        self.loss = loss
+        self.dtype = floatx() if dtype is None else np.dtype(dtype)
+        self.activations = [activation for _, activation in layers]
+
+        # all parameters live in one vector, so one optimizer step updates the whole network.
+        # weights[l] and biases[l] are views into it, grad_weights[l] and grad_biases[l]
+        # views into the gradient vector
+        shapes = []
+        n_in = n_features
+        for units, _ in layers:
+            shapes.append((n_in, units))
+            n_in = units
+        size = sum(n * j + j for n, j in shapes)
+        self.params = np.zeros(size, dtype=self.dtype)
+        self.grad = np.zeros(size, dtype=self.dtype)
+        self.weights, self.biases, self.grad_weights, self.grad_biases = [], [], [], []
+        start = 0
+        for n, j in shapes:
+            for vec, W_list, b_list in ((self.params, self.weights, self.biases),
+                                        (self.grad, self.grad_weights, self.grad_biases)):
+                W_list.append(vec[start:start + n * j].reshape(n, j))
+                b_list.append(vec[start + n * j:start + n * j + j])
+            start += n * j + j
+
+        # Glorot uniform weights and zero biases, the Keras Dense defaults
+        rng = np.random.default_rng(seed)
+        for W in self.weights:
+            limit = math.sqrt(6 / (W.shape[0] + W.shape[1]))
+            W[...] = rng.uniform(-limit, limit, W.shape)
+
+    def _forward(self, X):
+        """ Returns the activations of every layer, A[0] = X, and the output logits z """
+        A = [X]
+        for l, (W, b) in enumerate(zip(self.weights, self.biases)):
+            Z = np.matmul(A[-1], W)
+            Z += b
+            if l == len(self.weights) - 1:
+                return A, Z
+            A.append(ACTIVATIONS[self.activations[l]](Z))
+
+    def cost_gradient(self, X, y):
+        """
+        Computes the cost and its gradient w.r.t. all the parameters by backpropagation
+        Args:
+          X (ndarray (m,n)): Data, m examples with n features
+          y (ndarray (m,) or (m,1)): labels
+        Returns:
+          cost (scalar)          : mean loss over the examples
+          grad (ndarray (size,)) : gradient, laid out like params. It is the network's own
+                                   buffer, overwritten by the next call
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        m = X.shape[0]
+        A, Z = self._forward(X)
+
+        # gradient of the mean loss w.r.t. the logits z
+        if self.loss == "binary_crossentropy":
+            y = np.asarray(y, dtype=self.dtype).reshape(m, 1)
+            # log(1 + e^z) - y*z, written so exp never overflows
+            cost = np.mean(np.log1p(np.exp(-np.abs(Z))) + np.maximum(Z, 0) - y * Z)
+            dZ = sigmoid(Z)
+            dZ -= y
+        else:
+            y = np.asarray(y).reshape(-1).astype(int)
+            log_p = log_softmax(Z)
+            cost = -np.mean(log_p[np.arange(m), y])
+            dZ = np.exp(log_p, out=log_p)
+            dZ[np.arange(m), y] -= 1
+        dZ /= m
+
+        for l in range(len(self.weights) - 1, -1, -1):
+            np.matmul(A[l].T, dZ, out=self.grad_weights[l])
+            np.sum(dZ, axis=0, out=self.grad_biases[l])
+            if l > 0:
+                dZ = BACKWARD[self.activations[l - 1]](np.matmul(dZ, self.weights[l].T), A[l])
+        return float(cost), self.grad
+
+    def fit(self, X, y, num_epochs=10, batch_size=32, alpha=0.001, optimizer=None, seed=None,
+            verbose=True, early_stopping=None):
+        """
+        Trains the network with mini-batches, one optimizer step per batch, like model.fit
+        Args:
+          X (ndarray (m,n))        : Data, m examples with n features
+          y (ndarray (m,) or (m,1)): labels
+          num_epochs (int)         : number of passes over the data
+          batch_size (int)         : examples per batch, 32 like Keras
+          alpha (float or function): learning rate, or a schedule mapping the step to alpha
+          optimizer                : optimizer of lab_utils_train, Adam() if None
+          seed (int)               : seed for shuffling the examples every epoch
+          verbose (bool)           : print the cost 10 times during training
+          early_stopping           : optional EarlyStopping, checked on the mean cost of each epoch
+        Returns:
+          J_history (CostHistory)  : mean batch cost of every epoch and the stop reason
+        """
+        schedule = alpha if callable(alpha) else (lambda step: alpha)
+        optimizer = Adam() if optimizer is None else optimizer
+        optimizer.start(self.params, 0.)
+        batches = array_batches(X, y, batch_size, shuffle=True, seed=seed)
+        J_history = CostHistory()
+        J_history.stop_reason = "num_iters"
+        step = 0
+        if early_stopping is not None:
+            early_stopping.start()
+
+        for epoch in range(num_epochs):
+            cost_sum = 0.
+            n_seen = 0
+            for X_b, y_b in batches():
+                cost, grad = self.cost_gradient(X_b, y_b)
+                # the bias slot of the optimizer protocol is unused, the biases are in params
+                optimizer.step(self.params, 0., grad, 0., schedule(step))
+                cost_sum += cost * X_b.shape[0]
+                n_seen += X_b.shape[0]
+                step += 1
+            J_history.append(cost_sum / n_seen)
+
+            if verbose and (epoch % math.ceil(num_epochs / 10) == 0 or epoch == num_epochs - 1):
+                print(f"Epoch {epoch:4}: Cost {J_history[-1]:8.4f}   ")
+
+            if early_stopping is not None and early_stopping.update(J_history[-1]):
+                J_history.stop_reason = early_stopping.stop_reason
+                if verbose:
+                    print(f"Epoch {epoch:4}: Cost {J_history[-1]:8.4f}   stopped ({J_history.stop_reason})")
+                break
+
+        J_history.num_iters = len(J_history)
+        return J_history
+
+    def predict(self, X):
+        """
+        Computes the output of the network, with the output activation applied like
+        Keras model.predict: probabilities for sigmoid or softmax, logits for linear
+        Args:
+          X (ndarray (m,n)): Data, m examples with n features
+        Returns:
+          A (ndarray (m,k)): output of the last layer
+        """
+        _, Z = self._forward(np.asarray(X, dtype=self.dtype))
+        return ACTIVATIONS[self.activations[-1]](Z)
+
+    def to_dense_model(self):
+        """ Returns a copy of the trained network as a lab_utils_inference.DenseModel """
+        return DenseModel([(W.copy(), b.copy(), a) for W, b, a in
+                           zip(self.weights, self.biases, self.activations)], self.dtype)
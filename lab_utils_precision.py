@@ -0,0 +1,122 @@
+"""
+lab_utils_precision.py
+    A global floating point policy for the NumPy code in the labs, similar to
+    tf.keras.backend.set_floatx. Parameters and results are arrays of floatx, float64
+    by default. A data matrix that already holds floats keeps its dtype (cast_data), so
+    it is never copied, and the parameters are cast to it for the products with X.
+    Reductions over examples (sums and means) can be accumulated in a wider dtype
+    and the result is cast back to floatx.
+"""
+import numpy as np
+from lab_utils_sparse import issparse
+
+_floatx = np.dtype(np.float64)
+_accumulate = np.dtype(np.float64)
+
+
+def set_floatx(dtype):
+    """ Sets the dtype the functions compute in, e.g. 'float32' or 'float64' """
+    global _floatx
+    _floatx = np.dtype(dtype)
+
+
+def floatx():
+    """ Returns the dtype the functions compute in """
+    return _floatx
+
+
+def set_accumulation(dtype):
+    """ Sets the dtype sums and means are accumulated in, e.g. 'float64' """
+    global _accumulate
+    _accumulate = np.dtype(dtype)
+
+
+def accumulation():
+    """ Returns the dtype sums and means are accumulated in """
+    return _accumulate
+
+
+class precision:
+    """
+    Context manager that sets the policy for a block of code and restores it after
+        with precision("float32", accumulate="float64"):
+            mu, var = estimate_gaussian(X)
+    If accumulate is None, reductions are accumulated in floatx
+    """
+    def __init__(self, floatx, accumulate=None):
+        self.floatx = floatx
+        self.accumulate = floatx if accumulate is None else accumulate
+
+    def __enter__(self):
+        self.saved = (_floatx, _accumulate)
+        set_floatx(self.floatx)
+        set_accumulation(self.accumulate)
+        return self
+
+    def __exit__(self, *exc):
+        set_floatx(self.saved[0])
+        set_accumulation(self.saved[1])
+
+
+def cast(a, dtype=None):
+    """
+    Returns a as an array of dtype floatx, or of dtype if given. No copy is made if it
+    already is one. scipy.sparse matrices stay sparse
+    """
+    dtype = _floatx if dtype is None else dtype
+    if issparse(a):
+        return a if a.dtype == dtype else a.astype(dtype)
+    return np.asarray(a, dtype=dtype)
+
+
+def cast_data(X):
+    """
+    Returns the data matrix X with a floating point dtype. Float data, dense or sparse, is
+    returned as it is: a large X is never copied, and float32 data stays float32.
+    Other dtypes (int, bool) are converted to floatx; do this once, before a training loop,
+    rather than at every step. The parameters should then be cast to X.dtype, since a
+    product of X with an array of another dtype converts all of X first.
+    Only X goes through cast_data: the targets y may be integer class labels
+    """
+    X = X if issparse(X) else np.asarray(X)
+    return X if X.dtype.kind == 'f' else cast(X)
+
+
+def reduce_sum(a, axis=None):
+    """ np.sum accumulated in the accumulation dtype, returned in floatx """
+    return np.sum(a, axis=axis, dtype=_accumulate).astype(_floatx)
+
+
+def reduce_mean(a, axis=None):
+    """ np.mean accumulated in the accumulation dtype, returned in floatx """
+    return np.mean(a, axis=axis, dtype=_accumulate).astype(_floatx)
+
+
+def compare_precision(function, *args, floatx="float32", accumulate="float64"):
+    """
+    Runs function on args in float64 and in the given precision and compares the results
+    Args:
+      function (function): function returning an array or a tuple of arrays
+      args               : its arguments. Floating point arrays are cast to each dtype
+      floatx (str)       : dtype to compare with float64
+      accumulate (str)   : accumulation dtype to compare with float64
+    Returns:
+      max_rel_err (float): largest difference relative to the largest float64 value,
+                           over all the outputs
+      dtypes (list)      : dtype of each output in the given precision, to spot upcasts
+    """
+    def run(dtype, acc):
+        with precision(dtype, acc):
+            cast_args = [cast(a) if isinstance(a, np.ndarray) and a.dtype.kind == 'f' else a
+                         for a in args]
+            out = function(*cast_args)
+        return out if isinstance(out, tuple) else (out,)
+
+    reference = run("float64", "float64")
+    result = run(floatx, accumulate)
+    max_rel_err = 0.
+    for ref, res in zip(reference, result):
+        ref = np.asarray(ref, dtype=np.float64)
+        scale = max(np.max(np.abs(ref)), np.finfo(np.float64).tiny)
+        max_rel_err = max(max_rel_err, np.max(np.abs(np.asarray(res, dtype=np.float64) - ref)) / scale)
+    return max_rel_err, [np.asarray(res).dtype for res in result]
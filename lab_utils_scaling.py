@@ -0,0 +1,110 @@
+"""
+lab_utils_scaling.py
+    z-score normalization with statistics that are accumulated one chunk at a time,
+    so datasets larger than memory can be normalized and the statistics reused at serving time
+"""
+import numpy as np
+
+
+class ZScoreNormalizer:
+    """
+    z-score normalizer, x_norm = (x - mu) / sigma per feature.
+
+    The mean and the sum of squared deviations (m2) are accumulated with the
+    parallel update of Chan et al.: the statistics of a new chunk are computed
+    with NumPy and merged with the running ones. This is Welford's online
+    algorithm applied a chunk instead of a row at a time. It avoids the loss of
+    precision of the sum-of-squares formula and needs one pass over the data.
+    Statistics are kept in float64 whatever the dtype of the data.
+
+    Attributes:
+      n (int)             : number of examples seen
+      mu (ndarray (n,))   : mean of each feature
+      sigma (ndarray (n,)): standard deviation of each feature, as np.std (ddof=0)
+    """
+    def __init__(self):
+        self.n = 0
+        self.mu = None
+        self.m2 = None
+
+    @property
+    def sigma(self):
+        return np.sqrt(self.m2 / self.n)
+
+    def merge(self, n, mu, m2):
+        """
+        Merges the statistics of another set of examples into this one
+        Args:
+          n (int)            : number of examples in the other set
+          mu (ndarray (n,))  : their mean
+          m2 (ndarray (n,))  : their sum of squared deviations from mu
+        Returns:
+          self
+        """
+        if n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mu, self.m2 = n, np.array(mu, dtype=np.float64), np.array(m2, dtype=np.float64)
+            return self
+        n_total = self.n + n
+        delta = mu - self.mu
+        self.mu = self.mu + delta * (n / n_total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.n * n / n_total)
+        self.n = n_total
+        return self
+
+    def partial_fit(self, X):
+        """
+        Updates the statistics with a chunk of examples
+        Args:
+          X (ndarray (m,n)): chunk of input data
+        Returns:
+          self
+        """
+        X = np.asarray(X)
+        if X.shape[0] == 0:         # e.g. the tail of a file; np.mean would warn and give nan
+            return self
+        mu = np.mean(X, axis=0, dtype=np.float64)
+        m2 = np.sum(np.square(X - mu), axis=0, dtype=np.float64)
+        return self.merge(X.shape[0], mu, m2)
+
+    def fit(self, X, chunk_size=65536):
+        """
+        Computes the statistics of X, chunk_size rows at a time. X can be a np.memmap.
+        """
+        self.__init__()
+        for start in range(0, X.shape[0], chunk_size):
+            self.partial_fit(X[start:start + chunk_size])
+        return self
+
+    def transform(self, X, out=None, inplace=False):
+        """
+        Normalizes X with the stored statistics
+        Args:
+          X (ndarray (m,n)) : input data
+          out (ndarray)     : optional array to write the result into
+          inplace (bool)    : overwrite X itself, X must be a floating point array
+        Returns:
+          X_norm (ndarray (m,n)): normalized data
+        """
+        if inplace:
+            out = X
+        if out is None:
+            return (X - self.mu) / self.sigma
+        np.subtract(X, self.mu, out=out, casting='same_kind')
+        np.divide(out, self.sigma, out=out, casting='same_kind')
+        return out
+
+    def inverse_transform(self, X_norm):
+        """ Maps normalized data back to the original scale """
+        return X_norm * self.sigma + self.mu
+
+    def save(self, file):
+        """ Saves the statistics to a .npz file """
+        np.savez(file, n=self.n, mu=self.mu, m2=self.m2)
+
+    @classmethod
+    def load(cls, file):
+        """ Loads statistics saved with save() """
+        with np.load(file) as data:
+            return cls().merge(int(data["n"]), data["mu"], data["m2"])
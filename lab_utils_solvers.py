@@ -0,0 +1,245 @@
+"""
+lab_utils_solvers.py
+    Direct and second-order solvers for linear and logistic regression, and a single
+    fit() entry point that selects between them and gradient descent
+"""
+import math
+import numpy as np
+from lab_utils_precision import cast_data
+from lab_utils_train import linear_cost_gradient, logistic_cost_gradient, CostHistory, EarlyStopping
+
+COST_GRADIENT = {"linear": linear_cost_gradient, "logistic": logistic_cost_gradient}
+
+
+def batch_gradient_descent(X, y, w_in, b_in, cost_gradient_function, alpha, num_iters,
+                           lambda_=0., early_stopping=None):
+    """
+    Vectorized batch gradient descent without printing, used by fit(solver="gd")
+    Args:
+      X (ndarray (m,n))      : Data, m examples with n features
+      y (ndarray (m,))       : target values
+      w_in (ndarray (n,))    : Initial values of model parameters
+      b_in (scalar)          : Initial value of model parameter
+      cost_gradient_function : function returning (cost, dj_db, dj_dw)
+      alpha (float)          : Learning rate
+      num_iters (int)        : maximum number of iterations
+      lambda_ (scalar)       : regularization constant
+      early_stopping         : optional EarlyStopping
+    Returns:
+      w, b, J_history (CostHistory)
+    """
+    X = cast_data(X)
+    w = np.array(w_in, dtype=float)
+    b = float(b_in)
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    if early_stopping is not None:
+        early_stopping.start()
+
+    for i in range(num_iters):
+        cost, dj_db, dj_dw = cost_gradient_function(X, y, w, b, lambda_)
+        J_history.append(cost)
+        if early_stopping is not None and early_stopping.update(cost, dj_dw, dj_db):
+            J_history.stop_reason = early_stopping.stop_reason
+            break
+        w -= alpha * dj_dw
+        b -= alpha * dj_db
+
+    J_history.num_iters = len(J_history)
+    return w, b, J_history
+
+
+def normal_equation(X, y, lambda_=0.):
+    """
+    Solves linear regression directly from the normal equations with a Cholesky factorization.
+    With lambda_ > 0 this is ridge regression; as in the cost, b is not regularized.
+    Args:
+      X (ndarray (m,n)): Data, m examples with n features
+      y (ndarray (m,)) : target values
+      lambda_ (scalar) : regularization constant
+    Returns:
+      w (ndarray (n,)) : parameters that minimize the cost
+      b (scalar)       : parameter that minimizes the cost
+    """
+    m, n = X.shape
+    x_sum = X.sum(axis=0)
+
+    # [X 1]^T [X 1] + lambda_ * I, without building [X 1]
+    A = np.empty((n + 1, n + 1))
+    A[:n, :n] = X.T @ X + lambda_ * np.eye(n)
+    A[:n, n] = x_sum
+    A[n, :n] = x_sum
+    A[n, n] = m
+    rhs = np.append(X.T @ y, np.sum(y))
+
+    try:
+        L = np.linalg.cholesky(A)
+        theta = np.linalg.solve(L.T, np.linalg.solve(L, rhs))
+    except np.linalg.LinAlgError:
+        # singular without regularization, e.g. duplicated features
+        theta = np.linalg.lstsq(A, rhs, rcond=None)[0]
+
+    return theta[:n], theta[n]
+
+
+def newton(X, y, w_in, b_in, model="logistic", lambda_=0., tol=1e-6, max_iter=100):
+    """
+    Newton's method. For logistic regression this is iteratively reweighted least squares
+    (IRLS); for linear regression it converges in a single step. Each step is halved until
+    the cost decreases, which keeps the method stable far from the minimum.
+    Args:
+      X (ndarray (m,n))   : Data, m examples with n features
+      y (ndarray (m,))    : target values
+      w_in (ndarray (n,)) : Initial values of model parameters
+      b_in (scalar)       : Initial value of model parameter
+      model (str)         : "linear" or "logistic"
+      lambda_ (scalar)    : regularization constant
+      tol (float)         : stop when the norm of the gradient is below tol
+      max_iter (int)      : maximum number of Newton steps
+    Returns:
+      w, b, J_history (CostHistory)
+    """
+    cost_gradient = COST_GRADIENT[model]
+    m, n = X.shape
+    w = np.array(w_in, dtype=float)
+    b = float(b_in)
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+
+    cost, dj_db, dj_dw = cost_gradient(X, y, w, b, lambda_)
+    for i in range(max_iter):
+        J_history.append(cost)
+        if math.sqrt(np.dot(dj_dw, dj_dw) + dj_db ** 2) < tol:
+            J_history.stop_reason = "gtol"
+            break
+
+        # Hessian of the cost w.r.t. (w, b): [X 1]^T S [X 1] / m + lambda_ / m on the w block
+        if model == "logistic":
+            f_wb = 1 / (1 + np.exp(-(X @ w + b)))
+            s = f_wb * (1 - f_wb)
+        else:
+            s = np.ones(m)
+        Xs = X * s[:, np.newaxis]
+        H = np.empty((n + 1, n + 1))
+        H[:n, :n] = (X.T @ Xs + lambda_ * np.eye(n)) / m
+        H[:n, n] = H[n, :n] = Xs.sum(axis=0) / m
+        H[n, n] = s.sum() / m
+
+        try:
+            step = np.linalg.solve(H, np.append(dj_dw, dj_db))
+        except np.linalg.LinAlgError:
+            step = np.linalg.lstsq(H, np.append(dj_dw, dj_db), rcond=None)[0]
+
+        t = 1.
+        while True:
+            w_new, b_new = w - t * step[:n], b - t * step[n]
+            cost_new, db_new, dw_new = cost_gradient(X, y, w_new, b_new, lambda_)
+            if cost_new <= cost or t < 1e-8:
+                break
+            t /= 2
+        w, b, cost, dj_db, dj_dw = w_new, b_new, cost_new, db_new, dw_new
+
+    J_history.num_iters = len(J_history)
+    return w, b, J_history
+
+
+def lbfgs(X, y, w_in, b_in, model="logistic", lambda_=0., tol=1e-6, max_iter=1000):
+    """
+    Limited-memory BFGS through scipy.optimize.minimize. Needs scipy.
+    Args:
+      X (ndarray (m,n))   : Data, m examples with n features
+      y (ndarray (m,))    : target values
+      w_in (ndarray (n,)) : Initial values of model parameters
+      b_in (scalar)       : Initial value of model parameter
+      model (str)         : "linear" or "logistic"
+      lambda_ (scalar)    : regularization constant
+      tol (float)         : stop when the norm of the gradient is below tol
+      max_iter (int)      : maximum number of iterations
+    Returns:
+      w, b, J_history (CostHistory). The stop reason is "gtol", "num_iters", or SciPy's
+      message when the line search ended the run first
+    """
+    from scipy.optimize import minimize
+
+    cost_gradient = COST_GRADIENT[model]
+    n = X.shape[1]
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    theta = np.append(np.asarray(w_in, dtype=float), b_in)
+    last = {}
+
+    def cost_and_grad(theta):
+        cost, dj_db, dj_dw = cost_gradient(X, y, theta[:n], theta[n], lambda_)
+        grad = np.append(dj_dw, dj_db)
+        last["cost"], last["grad_norm"] = cost, np.linalg.norm(grad)
+        return cost, grad
+
+    # SciPy's own tests (the largest projected gradient component, and the relative drop
+    # of the cost) are turned off, so the run stops on the gradient norm like "gd" and
+    # "newton". The last evaluation of an iteration is the accepted point, so the
+    # callback reuses its cost and gradient norm
+    def callback(theta):
+        J_history.append(last["cost"])
+        if last["grad_norm"] < tol:
+            J_history.stop_reason = "gtol"
+            raise StopIteration
+
+    cost_and_grad(theta)
+    if last["grad_norm"] < tol:
+        J_history.append(last["cost"])
+        J_history.stop_reason, J_history.num_iters = "gtol", 0
+        return theta[:n], theta[n], J_history
+
+    res = minimize(cost_and_grad, theta, jac=True, method="L-BFGS-B", callback=callback,
+                   options={"maxiter": max_iter, "gtol": 0., "ftol": 0.})
+    if J_history.stop_reason != "gtol" and res.nit < max_iter:
+        # stopped by the line search, e.g. when rounding errors prevent progress
+        J_history.stop_reason = str(res.message)
+    J_history.num_iters = res.nit
+    return res.x[:n], res.x[n], J_history
+
+
+def fit(X, y, model="linear", solver="gd", lambda_=0., w_in=None, b_in=0., alpha=0.01,
+        num_iters=10000, tol=1e-6, max_time=None):
+    """
+    Fits linear or logistic regression with the selected solver
+    Args:
+      X (ndarray (m,n))   : Data, m examples with n features
+      y (ndarray (m,))    : target values
+      model (str)         : "linear" or "logistic"
+      solver (str)        : "gd"     batch gradient descent with learning rate alpha
+                            "normal" normal equations with Cholesky, linear model only
+                            "newton" Newton's method / IRLS
+                            "lbfgs"  L-BFGS (needs scipy)
+      lambda_ (scalar)    : regularization constant
+      w_in (ndarray (n,)) : Initial values of model parameters, zeros if None
+      b_in (scalar)       : Initial value of model parameter
+      alpha (float)       : Learning rate, "gd" only
+      num_iters (int)     : maximum number of iterations
+      tol (float)         : gradient tolerance at which the iterative solvers stop
+      max_time (float)    : wall-clock budget in seconds, "gd" only
+    Returns:
+      w (ndarray (n,))        : fitted parameters
+      b (scalar)              : fitted parameter
+      J_history (CostHistory) : cost per iteration and the reason the solver stopped
+    """
+    if model not in COST_GRADIENT:
+        raise ValueError(f"model must be 'linear' or 'logistic', got {model!r}")
+    if w_in is None:
+        w_in = np.zeros(X.shape[1])
+
+    if solver == "gd":
+        return batch_gradient_descent(X, y, w_in, b_in, COST_GRADIENT[model], alpha, num_iters, lambda_,
+                                      EarlyStopping(gtol=tol, max_time=max_time))
+    if solver == "normal":
+        if model != "linear":
+            raise ValueError("solver 'normal' only applies to the linear model")
+        w, b = normal_equation(X, y, lambda_)
+        J_history = CostHistory([linear_cost_gradient(X, y, w, b, lambda_)[0]])
+        J_history.stop_reason, J_history.num_iters = "exact", 1
+        return w, b, J_history
+    if solver == "newton":
+        return newton(X, y, w_in, b_in, model, lambda_, tol, num_iters)
+    if solver == "lbfgs":
+        return lbfgs(X, y, w_in, b_in, model, lambda_, tol, num_iters)
+    raise ValueError(f"unknown solver {solver!r}, use 'gd', 'normal', 'newton' or 'lbfgs'")
@@ -0,0 +1,55 @@
+"""
+lab_utils_sparse.py
+    Helpers for scipy.sparse feature matrices, such as one-hot encoded categorical data.
+    scipy is only needed when sparse matrices are actually used.
+"""
+import sys
+import numpy as np
+
+
+def issparse(a):
+    """ True if a is a scipy.sparse matrix or array. Does not import scipy if it is not loaded """
+    # a sparse matrix cannot exist unless scipy.sparse has been imported already
+    sparse = sys.modules.get("scipy.sparse")
+    return sparse is not None and sparse.issparse(a)
+
+
+def rmatvec(X, v, out=None):
+    """
+    Computes X.T @ v for a dense or a sparse X without densifying it
+    Args:
+      X (ndarray or sparse matrix (m,n)): Data, m examples with n features
+      v (ndarray (m,))                  : vector, e.g. the prediction errors
+      out (ndarray (n,))                : optional array the result is written into
+    Returns:
+      r (ndarray (n,)): X.T @ v
+    """
+    if not issparse(X):
+        return np.matmul(X.T, v, out=out)
+    r = X.T @ v            # sparse matrix-vector product, cost proportional to nnz
+    if out is None:
+        return r
+    out[...] = r
+    return out
+
+
+def one_hot_features(codes, n_categories, dtype=np.float64):
+    """
+    One-hot encodes categorical features directly into a CSR matrix
+    Args:
+      codes (ndarray (m,k))    : category of each of the k features of each example,
+                                 codes[:, j] in 0..n_categories[j]-1
+      n_categories (array_like (k,)): number of categories of each feature
+      dtype                    : dtype of the stored ones
+    Returns:
+      X (csr_matrix (m, sum(n_categories))): one 1 per feature and example, k nonzeros per row
+    """
+    from scipy.sparse import csr_matrix
+
+    codes = np.asarray(codes)
+    m, k = codes.shape
+    offsets = np.concatenate(([0], np.cumsum(n_categories)[:-1]))
+    indices = (codes + offsets).ravel()
+    indptr = np.arange(0, m * k + 1, k)
+    return csr_matrix((np.ones(m * k, dtype=dtype), indices, indptr),
+                      shape=(m, int(np.sum(n_categories))))
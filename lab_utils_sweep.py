@@ -0,0 +1,211 @@
+"""
+lab_utils_sweep.py
+    Runs independent training runs (one per hyperparameter setting) in parallel worker
+    processes. The training arrays are placed in shared memory once, so they are not
+    pickled and copied to the workers for every run.
+    serial_sweep runs the same sweep in the calling process.
+    For sweeps over alpha and lambda_ only, multi_gradient_descent trains all the settings
+    together in a single process, with one matrix product per step.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from lab_utils_precision import cast, cast_data
+from lab_utils_train import linear_cost_gradient, logistic_cost_gradient
+from lab_utils_solvers import batch_gradient_descent
+
+# arrays attached by each worker process, name -> ndarray view of the shared memory
+_shared_arrays = {}
+_shared_blocks = []
+
+
+def _attach(specs):
+    """ Worker initializer: maps the shared memory blocks into NumPy arrays """
+    for name, (shm_name, shape, dtype) in specs.items():
+        # the workers share the resource tracker of the parent, which unlinks the block
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared_blocks.append(shm)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        array.flags.writeable = False
+        _shared_arrays[name] = array
+
+
+def _run(task, arrays=None):
+    """ Runs one setting in a worker and returns its row of the result table """
+    fit_function, params = task
+    arrays = _shared_arrays if arrays is None else arrays
+    tic = time.perf_counter()
+    result = fit_function(**arrays, **params)
+    row = dict(params)
+    row.update(result)
+    row["time"] = time.perf_counter() - tic
+    return row
+
+
+def serial_sweep(fit_function, param_grid, arrays):
+    """
+    Calls fit_function once per setting in param_grid, one after the other in this process.
+    Takes the arguments of parallel_sweep and returns the same table, for functions that
+    cannot be sent to worker processes
+    """
+    return [_run((fit_function, params), arrays) for params in param_grid]
+
+
+def parallel_sweep(fit_function, param_grid, arrays, processes=None, mp_context=None):
+    """
+    Calls fit_function once per setting in param_grid, in parallel worker processes
+    Args:
+      fit_function (function): called as fit_function(**arrays, **params) and returns a dict
+                               of results, for example {"J_history": ..., "err_cv": ...}.
+                               It must be picklable: a function defined at the top level of a
+                               module, or of the notebook when processes are forked
+      param_grid (list)      : list of dicts, one per setting, e.g. [{"alpha": 0.1}, ...]
+      arrays (dict)          : name -> ndarray shared read-only by all runs, e.g. {"X": X, "y": y}
+      processes (int)        : number of worker processes, defaults to the number of cores
+      mp_context             : start method of the workers, "fork", "spawn" or "forkserver",
+                               or a multiprocessing context. The platform default if None,
+                               which is not "fork" on macOS, Windows and Python >= 3.14
+    Returns:
+      results (list): one dict per setting, in the order of param_grid, holding the
+                      parameters, the returned results and the run time in seconds
+    """
+    if isinstance(mp_context, str):
+        mp_context = multiprocessing.get_context(mp_context)
+    blocks = []
+    try:
+        specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            specs[name] = (shm.name, array.shape, array.dtype.str)
+
+        with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context,
+                                 initializer=_attach, initargs=(specs,)) as pool:
+            results = list(pool.map(_run, [(fit_function, params) for params in param_grid]))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def fit_gradient_descent(X, y, alpha, num_iters, lambda_=0., model="linear", X_cv=None, y_cv=None):
+    """
+    A ready-made fit_function for parallel_sweep: vectorized batch gradient descent on the
+    linear or logistic cost from zero initial parameters
+    Args:
+      X, y                    : training data
+      alpha (float)           : learning rate
+      num_iters (int)         : number of iterations
+      lambda_ (scalar)        : regularization constant
+      model (str)             : "linear" or "logistic"
+      X_cv, y_cv              : optional cross-validation data
+    Returns:
+      dict with w, b, the cost history J_history, the final training cost, and the
+      (unregularized) cross-validation cost when X_cv is given
+    """
+    cost_gradient = linear_cost_gradient if model == "linear" else logistic_cost_gradient
+    with np.errstate(over='ignore', invalid='ignore'):
+        w, b, J_history = batch_gradient_descent(X, y, np.zeros(X.shape[1]), 0., cost_gradient,
+                                                 alpha, num_iters, lambda_)
+        result = {"w": w, "b": b, "J_history": np.array(J_history), "cost": J_history[-1]}
+        if X_cv is not None:
+            result["cost_cv"] = cost_gradient(X_cv, y_cv, w, b)[0]
+    return result
+
+
+def multi_cost_gradient(X, y, W, b, lambdas, model="linear"):
+    """
+    Computes the cost and the gradient of P models at once. Column p of W and entry p of b
+    are the parameters of model p, regularized with lambdas[p].
+    Args:
+      X (ndarray (m,n)) : Data, m examples with n features
+      y (ndarray (m,))  : target values
+      W (ndarray (n,P)) : model parameters, one column per model
+      b (ndarray (P,))  : model parameters
+      lambdas (ndarray (P,)): regularization constant of each model
+      model (str)       : "linear" or "logistic"
+    Returns:
+      cost (ndarray (P,))    : cost of each model
+      dj_db (ndarray (P,))   : The gradient of each cost w.r.t. its parameter b.
+      dj_dW (ndarray (n,P))  : The gradient of each cost w.r.t. its parameters w.
+    """
+    m = X.shape[0]
+    X = cast_data(X)
+    y, W, b, lambdas = cast(y, X.dtype), cast(W, X.dtype), cast(b, X.dtype), cast(lambdas, X.dtype)
+    # residuals are kept as (P,m), one contiguous row per model, so the reductions are fast
+    Z = W.T @ X.T
+    Z += b[:, np.newaxis]
+    reg = np.einsum('ij,ij->j', W, W) * (lambdas / (2 * m))
+    if model == "linear":
+        err = np.subtract(Z, y, out=Z)
+        cost = np.einsum('ij,ij->i', err, err) / (2 * m) + reg
+    else:
+        # one exp(-|z|) serves both the loss log(1 + e^z) - y*z and the sigmoid
+        e = np.exp(-np.abs(Z))
+        cost = np.mean(np.log1p(e) + np.maximum(Z, 0) - y * Z, axis=1) + reg
+        f_wb = np.where(Z >= 0, 1, e)
+        f_wb /= 1 + e
+        err = np.subtract(f_wb, y, out=Z)
+    dj_db = np.sum(err, axis=1) / m
+    dj_dW = (err @ X).T
+    dj_dW /= m
+    dj_dW += W * (lambdas / m)
+    return cast(cost), cast(dj_db), cast(dj_dW)
+
+
+def multi_gradient_descent(X, y, alphas, lambdas=0., num_iters=1000, model="linear",
+                           W_in=None, b_in=None):
+    """
+    Batch gradient descent for P models on the same data, trained side by side. The
+    parameter vectors are stacked in the columns of an (n,P) matrix, so each step takes
+    one matrix-matrix product X.T @ residuals instead of P matrix-vector products.
+    Args:
+      X (ndarray (m,n))      : Data, m examples with n features
+      y (ndarray (m,))       : target values
+      alphas (array_like (P,)) : learning rate of each model
+      lambdas (array_like (P,)): regularization constant of each model, or one for all
+      num_iters (int)        : number of iterations
+      model (str)            : "linear" or "logistic"
+      W_in (ndarray (n,P))   : initial parameters, zeros if None
+      b_in (ndarray (P,))    : initial parameters, zeros if None
+    Returns:
+      W (ndarray (n,P))             : fitted parameters, column p for model p
+      b (ndarray (P,))              : fitted parameters
+      J_history (ndarray (num_iters,P)) : cost of each model at each iteration
+    """
+    X = cast_data(X)
+    alphas = np.asarray(alphas, dtype=float)
+    P = alphas.shape[0]
+    lambdas = np.broadcast_to(np.asarray(lambdas, dtype=float), (P,))
+    W = np.zeros((X.shape[1], P)) if W_in is None else np.array(W_in, dtype=float)
+    b = np.zeros(P) if b_in is None else np.array(b_in, dtype=float)
+    J_history = np.empty((num_iters, P))
+
+    for i in range(num_iters):
+        J_history[i], dj_db, dj_dW = multi_cost_gradient(X, y, W, b, lambdas, model)
+        dj_dW *= alphas
+        W -= dj_dW
+        b -= alphas * dj_db
+
+    return W, b, J_history
+
+
+def format_table(results, columns):
+    """
+    Formats the scalar columns of a parallel_sweep result as a text table
+    Args:
+      results (list): result of parallel_sweep
+      columns (list): names of the columns to show
+    Returns:
+      table (str)
+    """
+    lines = ["".join(f"{c:>14}" for c in columns)]
+    for row in results:
+        lines.append("".join(f"{row[c]:>14.4g}" if np.isscalar(row[c]) and not isinstance(row[c], str)
+                             else f"{str(row[c]):>14}" for c in columns))
+    return "\n".join(lines)
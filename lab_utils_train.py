@@ -0,0 +1,769 @@
+"""
+lab_utils_train.py
+    Training routines for the linear and logistic regression labs:
+    vectorized cost and gradient functions, mini-batch sources, learning rate schedules,
+    optimizers, training history, early stopping, checkpoints and learning rate selection
+    The cost and gradient functions return the dtype set with lab_utils_precision.set_floatx.
+    They compute in the dtype of X when it holds floats, so X is never copied
+"""
+import math
+import os
+import time
+import numpy as np
+from lab_utils_precision import cast, cast_data, reduce_sum, reduce_mean
+
+
+def linear_cost_gradient(X, y, w, b, lambda_=0.):
+    """
+    Computes the cost and the gradient for (regularized) linear regression in one pass
+    Args:
+      X (ndarray (m,n)): Data, m examples with n features
+      y (ndarray (m,)) : target values
+      w (ndarray (n,)) : model parameters
+      b (scalar)       : model parameter
+      lambda_ (scalar) : regularization constant, 0 for no regularization
+    Returns:
+      cost (scalar)       : cost
+      dj_db (scalar)      : The gradient of the cost w.r.t. the parameter b.
+      dj_dw (ndarray (n,)): The gradient of the cost w.r.t. the parameters w.
+    """
+    m = X.shape[0]
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    err = X @ w + b - y
+    cost = reduce_sum(np.square(err)) / (2 * m) + (lambda_ / (2 * m)) * reduce_sum(np.square(w))
+    dj_db = reduce_sum(err) / m
+    dj_dw = cast((X.T @ err) / m + (lambda_ / m) * w)
+    return cost, dj_db, dj_dw
+
+
+def logistic_cost_gradient(X, y, w, b, lambda_=0.):
+    """
+    Computes the cost and the gradient for (regularized) logistic regression in one pass.
+    The loss is written as log(1 + e^z) - y*z so it stays finite for large |z|
+    Args:
+      X (ndarray (m,n)): Data, m examples with n features
+      y (ndarray (m,)) : target values, 0 or 1
+      w (ndarray (n,)) : model parameters
+      b (scalar)       : model parameter
+      lambda_ (scalar) : regularization constant, 0 for no regularization
+    Returns:
+      cost (scalar)       : cost
+      dj_db (scalar)      : The gradient of the cost w.r.t. the parameter b.
+      dj_dw (ndarray (n,)): The gradient of the cost w.r.t. the parameters w.
+    """
+    m = X.shape[0]
+    X = cast_data(X)
+    y, w, b = cast(y, X.dtype), cast(w, X.dtype), cast(b, X.dtype)
+    z = X @ w + b
+    # one exp(-|z|) serves both the loss and the sigmoid, and it cannot overflow
+    e = np.exp(-np.abs(z))
+    cost = reduce_mean(np.log1p(e) + np.maximum(z, 0) - y * z) + (lambda_ / (2 * m)) * reduce_sum(np.square(w))
+    err = np.where(z >= 0, 1, e)
+    err /= 1 + e
+    err -= y
+    dj_db = reduce_sum(err) / m
+    dj_dw = cast((X.T @ err) / m + (lambda_ / m) * w)
+    return cost, dj_db, dj_dw
+
+
+# ---------------------------------------------------------------------------
+# Mini-batch sources
+#
+# A batch source is a function taking no arguments that returns an iterator of
+# (X_batch, y_batch) pairs covering the training set once. It is called once per
+# epoch, so it can shuffle differently each time.
+# ---------------------------------------------------------------------------
+
+def array_batches(X, y, batch_size=32, shuffle=True, seed=None):
+    """
+    Returns a batch source over arrays X, y. X and y may be np.memmap arrays, in which
+    case only one batch is read into memory at a time.
+    Args:
+      X (ndarray (m,n)): Data, m examples with n features
+      y (ndarray (m,)) : target values
+      batch_size (int) : number of examples per batch
+      shuffle (bool)   : reshuffle the examples every epoch. For in-memory arrays all rows
+                         are permuted. For memory-mapped arrays only the order of the batches
+                         is permuted, so every batch is still one contiguous read from disk
+      seed (int)       : seed for the shuffling
+    Returns:
+      batches (function): batch source
+    """
+    m = X.shape[0]
+    rng = np.random.default_rng(seed)
+    on_disk = isinstance(X, np.memmap) or isinstance(y, np.memmap)
+
+    def batches():
+        starts = np.arange(0, m, batch_size)
+        if shuffle and not on_disk:
+            idx = rng.permutation(m)
+            for start in starts:
+                rows = idx[start:start + batch_size]
+                yield X[rows], y[rows]
+            return
+        if shuffle:
+            starts = rng.permutation(starts)
+        for start in starts:
+            yield np.asarray(X[start:start + batch_size]), np.asarray(y[start:start + batch_size])
+
+    return batches
+
+
+def npy_batches(X_file, y_file, batch_size=32, shuffle=True, seed=None):
+    """
+    Returns a batch source over two .npy files that are memory-mapped rather than loaded
+    Args:
+      X_file (str)     : path of the .npy file holding X, shape (m,n)
+      y_file (str)     : path of the .npy file holding y, shape (m,)
+      batch_size (int) : number of examples per batch
+      shuffle (bool)   : reshuffle the batches every epoch, see array_batches
+      seed (int)       : seed for the shuffling
+    Returns:
+      batches (function): batch source
+    """
+    X = np.load(X_file, mmap_mode='r')
+    y = np.load(y_file, mmap_mode='r')
+    return array_batches(X, y, batch_size, shuffle, seed)
+
+
+def generator_batches(make_chunks, batch_size=32):
+    """
+    Returns a batch source that regroups a stream of (X_chunk, y_chunk) pairs of any
+    size into batches of batch_size examples. The last batch of an epoch may be smaller.
+    Args:
+      make_chunks (function): called once per epoch, returns an iterator of (X_chunk, y_chunk)
+      batch_size (int)      : number of examples per batch
+    Returns:
+      batches (function): batch source
+    """
+    def batches():
+        X_buf, y_buf, n_buf = [], [], 0
+        for X_c, y_c in make_chunks():
+            X_buf.append(X_c)
+            y_buf.append(y_c)
+            n_buf += X_c.shape[0]
+            if n_buf < batch_size:
+                continue
+            X_all, y_all = np.concatenate(X_buf), np.concatenate(y_buf)
+            n_full = (n_buf // batch_size) * batch_size
+            for start in range(0, n_full, batch_size):
+                yield X_all[start:start + batch_size], y_all[start:start + batch_size]
+            X_buf, y_buf, n_buf = [X_all[n_full:]], [y_all[n_full:]], n_buf - n_full
+        if n_buf > 0:
+            yield np.concatenate(X_buf), np.concatenate(y_buf)
+
+    return batches
+
+
+# ---------------------------------------------------------------------------
+# Learning rate schedules
+#
+# A schedule is a function of the update step (0, 1, 2, ...) returning alpha.
+# ---------------------------------------------------------------------------
+
+def step_decay(alpha, drop=0.5, every=1000):
+    """ alpha is multiplied by drop every `every` steps """
+    return lambda step: alpha * drop ** (step // every)
+
+
+def exponential_decay(alpha, rate=0.999):
+    """ alpha is multiplied by rate every step """
+    return lambda step: alpha * rate ** step
+
+
+def inverse_time_decay(alpha, decay=1e-3):
+    """ alpha / (1 + decay * step), the classic Robbins-Monro style SGD schedule """
+    return lambda step: alpha / (1 + decay * step)
+
+
+def cosine_decay(alpha, total_steps, alpha_min=0.):
+    """ alpha follows half a cosine from alpha down to alpha_min over total_steps """
+    def schedule(step):
+        t = min(step, total_steps) / total_steps
+        return alpha_min + 0.5 * (alpha - alpha_min) * (1 + math.cos(math.pi * t))
+    return schedule
+
+
+# ---------------------------------------------------------------------------
+# Optimizers
+#
+# An optimizer turns the gradient into the parameter update. start(w, b) allocates
+# its state buffers once, then step(w, b, dj_dw, dj_db, alpha) updates the array w in
+# place, without allocating new arrays, and returns (w, b). state() and
+# load_state() expose the buffers so a Checkpoint can save and restore them.
+# ---------------------------------------------------------------------------
+
+class GradientDescent:
+    """ Plain gradient descent, w = w - alpha * dj_dw """
+    def start(self, w, b):
+        self.tmp = np.empty_like(w)
+
+    def step(self, w, b, dj_dw, dj_db, alpha):
+        np.multiply(dj_dw, alpha, out=self.tmp)
+        w -= self.tmp
+        return w, b - alpha * dj_db
+
+    def state(self):
+        return {}
+
+    def load_state(self, state):
+        for k, v in state.items():
+            setattr(self, k, np.copy(v) if np.ndim(v) else v[()])
+
+
+class Momentum(GradientDescent):
+    """
+    Gradient descent with momentum. A velocity accumulates the past gradients,
+        v = beta * v - alpha * dj_dw,   w = w + v
+    which speeds up progress along directions where the gradient keeps its sign and
+    damps the zig-zag across narrow valleys of badly scaled costs.
+    With nesterov=True the update looks ahead along the velocity,
+        w = w + beta * v - alpha * dj_dw
+    which is Nesterov's accelerated gradient written in terms of the gradient at w.
+    Args:
+      beta (float)    : momentum, the fraction of the velocity kept at each step
+      nesterov (bool) : use Nesterov's update
+    """
+    def __init__(self, beta=0.9, nesterov=False):
+        self.beta = beta
+        self.nesterov = nesterov
+
+    def start(self, w, b):
+        self.tmp = np.empty_like(w)
+        self.v_w = np.zeros_like(w)
+        self.v_b = 0.
+
+    def step(self, w, b, dj_dw, dj_db, alpha):
+        np.multiply(dj_dw, alpha, out=self.tmp)
+        self.v_w *= self.beta
+        self.v_w -= self.tmp
+        self.v_b = self.beta * self.v_b - alpha * dj_db
+        if self.nesterov:
+            w -= self.tmp
+            np.multiply(self.v_w, self.beta, out=self.tmp)
+            w += self.tmp
+            return w, b + self.beta * self.v_b - alpha * dj_db
+        w += self.v_w
+        return w, b + self.v_b
+
+    def state(self):
+        return {"v_w": self.v_w, "v_b": np.array(self.v_b)}
+
+
+class Nesterov(Momentum):
+    """ Momentum with Nesterov's accelerated gradient update """
+    def __init__(self, beta=0.9):
+        super().__init__(beta, nesterov=True)
+
+
+class RMSProp(GradientDescent):
+    """
+    RMSProp divides the step of each parameter by a running root mean square of its
+    gradient, so every parameter moves at a similar rate whatever the scale of its feature.
+        s = rho * s + (1 - rho) * dj_dw**2,   w = w - alpha * dj_dw / (sqrt(s) + epsilon)
+    Args:
+      rho (float)    : decay of the running average of the squared gradient
+      epsilon (float): small constant that avoids a division by zero
+    """
+    def __init__(self, rho=0.9, epsilon=1e-8):
+        self.rho = rho
+        self.epsilon = epsilon
+
+    def start(self, w, b):
+        self.tmp = np.empty_like(w)
+        self.s_w = np.zeros_like(w)
+        # b is a scalar or, for K classes, a (K,) vector; a 0-d array stands for a scalar
+        self.s_b = np.zeros_like(b)
+
+    def step(self, w, b, dj_dw, dj_db, alpha):
+        np.square(dj_dw, out=self.tmp)
+        self.tmp *= 1 - self.rho
+        self.s_w *= self.rho
+        self.s_w += self.tmp
+        self.s_b = self.rho * self.s_b + (1 - self.rho) * dj_db ** 2
+
+        np.sqrt(self.s_w, out=self.tmp)
+        self.tmp += self.epsilon
+        np.divide(dj_dw, self.tmp, out=self.tmp)
+        self.tmp *= alpha
+        w -= self.tmp
+        return w, b - alpha * dj_db / (np.sqrt(self.s_b) + self.epsilon)
+
+    def state(self):
+        return {"s_w": self.s_w, "s_b": np.array(self.s_b)}
+
+
+class Adam(GradientDescent):
+    """
+    Adam keeps running averages of the gradient (m) and of its square (v), corrects
+    their bias towards 0 in the first steps, and takes the step m / sqrt(v) per parameter:
+    momentum combined with the per-parameter scaling of RMSProp.
+    Args:
+      beta_1 (float) : decay of the average of the gradient
+      beta_2 (float) : decay of the average of the squared gradient
+      epsilon (float): small constant that avoids a division by zero
+    """
+    def __init__(self, beta_1=0.9, beta_2=0.999, epsilon=1e-8):
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+
+    def start(self, w, b):
+        self.tmp = np.empty_like(w)
+        self.m_w = np.zeros_like(w)
+        self.v_w = np.zeros_like(w)
+        self.m_b = np.zeros_like(b)
+        self.v_b = np.zeros_like(b)
+        self.t = 0
+
+    def step(self, w, b, dj_dw, dj_db, alpha):
+        b1, b2 = self.beta_1, self.beta_2
+        self.t += 1
+        np.multiply(dj_dw, 1 - b1, out=self.tmp)
+        self.m_w *= b1
+        self.m_w += self.tmp
+        np.square(dj_dw, out=self.tmp)
+        self.tmp *= 1 - b2
+        self.v_w *= b2
+        self.v_w += self.tmp
+        self.m_b = b1 * self.m_b + (1 - b1) * dj_db
+        self.v_b = b2 * self.v_b + (1 - b2) * dj_db ** 2
+
+        # bias correction folded into the step size and epsilon
+        correction = math.sqrt(1 - b2 ** self.t)
+        alpha_t = alpha * correction / (1 - b1 ** self.t)
+        epsilon_t = self.epsilon * correction
+        np.sqrt(self.v_w, out=self.tmp)
+        self.tmp += epsilon_t
+        np.divide(self.m_w, self.tmp, out=self.tmp)
+        self.tmp *= alpha_t
+        w -= self.tmp
+        return w, b - alpha_t * self.m_b / (np.sqrt(self.v_b) + epsilon_t)
+
+    def state(self):
+        return {"m_w": self.m_w, "v_w": self.v_w, "m_b": np.array(self.m_b),
+                "v_b": np.array(self.v_b), "t": np.array(self.t)}
+
+
+# ---------------------------------------------------------------------------
+# Early stopping
+# ---------------------------------------------------------------------------
+
+class CostHistory(list):
+    """
+    List of costs returned by the training loops. Besides the costs it records
+      stop_reason (str): why training stopped, one of "num_iters", "tol", "gtol", "max_time",
+                         "exact" for a closed-form solution, or SciPy's message when
+                         its line search ended an L-BFGS run
+      num_iters (int)  : number of iterations (or epochs) that were run
+    """
+    stop_reason = None
+    num_iters = None
+
+
+class HistoryRecorder:
+    """
+    Training log of fixed size. Costs are grouped into buckets of `every` iterations, and
+    each bucket keeps the min, max and last cost and the number of costs seen. The
+    buckets live in preallocated NumPy ring buffers of `capacity` entries, so once the
+    buffers are full the oldest buckets are overwritten and memory stays constant
+    however long training runs.
+    Optionally a copy of w is kept every `snapshot_every` iterations, in a second ring
+    buffer of `snapshot_capacity` rows.
+    Args:
+      capacity (int)          : number of buckets kept
+      every (int)             : iterations per bucket
+      snapshot_every (int)    : iterations between parameter snapshots, None for no snapshots
+      snapshot_capacity (int) : number of snapshots kept
+    """
+    def __init__(self, capacity=1000, every=1, snapshot_every=None, snapshot_capacity=100):
+        self.capacity = capacity
+        self.every = every
+        self.snapshot_every = snapshot_every
+        self.snapshot_capacity = snapshot_capacity
+
+        self.iteration = np.zeros(capacity, dtype=np.int64)     # first iteration of the bucket
+        self.cost_min = np.zeros(capacity)
+        self.cost_max = np.zeros(capacity)
+        self.cost_last = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.n_buckets = 0          # buckets started so far, including overwritten ones
+        self._bucket = None
+
+        self.snapshot_iteration = np.zeros(snapshot_capacity, dtype=np.int64)
+        self.snapshots = None       # allocated on the first snapshot, when the shape of w is known
+        self.n_snapshots = 0
+
+    def record(self, i, cost=None, w=None):
+        """
+        Records iteration i
+        Args:
+          i (int)        : iteration number
+          cost (scalar)  : cost at iteration i, or None if it was not computed
+          w (ndarray)    : parameters, copied if a snapshot is due at iteration i
+        """
+        if cost is not None:
+            cost = float(cost)
+            bucket = i // self.every
+            slot = bucket % self.capacity
+            if bucket != self._bucket:
+                self._bucket = bucket
+                self.n_buckets += 1
+                self.iteration[slot] = bucket * self.every
+                self.cost_min[slot] = self.cost_max[slot] = cost
+                self.count[slot] = 0
+            elif cost < self.cost_min[slot]:
+                self.cost_min[slot] = cost
+            elif cost > self.cost_max[slot]:
+                self.cost_max[slot] = cost
+            self.cost_last[slot] = cost
+            self.count[slot] += 1
+
+        if w is not None and self.snapshot_every and i % self.snapshot_every == 0:
+            if self.snapshots is None:
+                self.snapshots = np.zeros((self.snapshot_capacity,) + np.shape(w), dtype=np.result_type(w))
+            slot = self.n_snapshots % self.snapshot_capacity
+            self.snapshots[slot] = w
+            self.snapshot_iteration[slot] = i
+            self.n_snapshots += 1
+
+    @staticmethod
+    def _chronological(n_total, capacity):
+        """ Ring buffer slots from the oldest to the newest entry """
+        return np.arange(max(n_total - capacity, 0), n_total) % capacity
+
+    def __len__(self):
+        return min(self.n_buckets, self.capacity)
+
+    def buckets(self):
+        """
+        Returns the buckets kept, oldest first, as a dict of arrays with keys
+        iteration (first iteration of the bucket), min, max, last and count
+        """
+        slots = self._chronological(self.n_buckets, self.capacity)
+        return {"iteration": self.iteration[slots], "min": self.cost_min[slots],
+                "max": self.cost_max[slots], "last": self.cost_last[slots], "count": self.count[slots]}
+
+    def parameter_snapshots(self):
+        """
+        Returns the snapshots kept, oldest first
+        Returns:
+          iterations (ndarray (k,)) : iteration of each snapshot
+          W (ndarray (k,n))         : w at those iterations
+        """
+        if self.snapshots is None:
+            return np.zeros(0, dtype=np.int64), None
+        slots = self._chronological(self.n_snapshots, self.snapshot_capacity)
+        return self.snapshot_iteration[slots], self.snapshots[slots]
+
+    @property
+    def nbytes(self):
+        """ Memory used by the buffers in bytes """
+        arrays = [self.iteration, self.cost_min, self.cost_max, self.cost_last, self.count,
+                  self.snapshot_iteration]
+        if self.snapshots is not None:
+            arrays.append(self.snapshots)
+        return sum(a.nbytes for a in arrays)
+
+
+class EarlyStopping:
+    """
+    Stops gradient descent once it has converged or run out of time.
+    Args:
+      tol (float)     : stop when the relative change in cost, |J_prev - J| / |J_prev|,
+                        stays below tol for `patience` checks in a row
+      gtol (float)    : stop when the norm of the gradient (w and b together) is below gtol
+      patience (int)  : number of consecutive flat checks needed to stop on tol
+      max_time (float): wall-clock budget in seconds
+    Any criterion left at None is not checked.
+    """
+    def __init__(self, tol=None, gtol=None, patience=1, max_time=None):
+        self.tol = tol
+        self.gtol = gtol
+        self.patience = patience
+        self.max_time = max_time
+        self.start()
+
+    def start(self):
+        """ Resets the state, call before the first iteration """
+        self.stop_reason = None
+        self.prev_cost = None
+        self.wait = 0
+        self.start_time = time.perf_counter()
+
+    def update(self, cost=None, dj_dw=None, dj_db=None):
+        """
+        Checks the stopping criteria after an iteration. cost may be None on iterations
+        where it was not computed, and the gradient may be None if it is not available.
+        Returns:
+          stop (bool): True if training should stop, the reason is in self.stop_reason
+        """
+        if self.gtol is not None and dj_dw is not None:
+            # dj_db is a scalar, or a (K,) vector for the multi-class models
+            grad_norm = np.sqrt(np.sum(np.square(dj_dw)) + np.sum(np.square(dj_db)))
+            if grad_norm < self.gtol:
+                self.stop_reason = "gtol"
+                return True
+
+        if self.tol is not None and cost is not None:
+            cost = float(cost)
+            if self.prev_cost is not None:
+                rel_change = abs(self.prev_cost - cost) / max(abs(self.prev_cost), np.finfo(float).tiny)
+                self.wait = self.wait + 1 if rel_change < self.tol else 0
+                if self.wait >= self.patience:
+                    self.stop_reason = "tol"
+                    return True
+            self.prev_cost = cost
+
+        if self.max_time is not None and time.perf_counter() - self.start_time > self.max_time:
+            self.stop_reason = "max_time"
+            return True
+
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+class Checkpoint:
+    """
+    Saves the state of a training run to a .npz file every `every` iterations, so an
+    interrupted run can be resumed where it left off instead of from the start.
+    The file is written under a temporary name next to it and then renamed over the
+    previous checkpoint with os.replace, which is atomic: if the process dies while
+    saving, the previous checkpoint is still intact.
+    Args:
+      file (str)   : path of the checkpoint file, e.g. "logistic_ckpt.npz"
+      every (int)  : save every `every` iterations
+      resume (bool): load() returns the saved state if the file exists. With False,
+                     training starts from the beginning and overwrites the file
+    """
+    def __init__(self, file, every=1000, resume=True):
+        self.file = file
+        self.every = every
+        self.resume = resume
+
+    def due(self, i):
+        """ True if the state after iteration i should be saved """
+        return (i + 1) % self.every == 0
+
+    def save(self, iteration, w, b, J_history, state=None):
+        """
+        Writes the state atomically
+        Args:
+          iteration (int)    : number of iterations completed, the one to resume from
+          w (ndarray (n,))   : model parameters
+          b (scalar)         : model parameter
+          J_history (list)   : costs saved so far
+          state (dict)       : optional optimizer state, name -> ndarray
+        """
+        arrays = {"state_" + k: v for k, v in (state or {}).items()}
+        tmp = self.file + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, iteration=iteration, w=w, b=b,
+                     J_history=np.asarray(J_history, dtype=np.float64), **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.file)
+
+    def load(self):
+        """
+        Returns the saved state as a dict with keys iteration, w, b, J_history (list) and
+        state (dict), or None if resume is off or there is no checkpoint yet
+        """
+        if not self.resume or not os.path.exists(self.file):
+            return None
+        with np.load(self.file) as data:
+            return {"iteration": int(data["iteration"]),
+                    "w": data["w"],
+                    "b": data["b"][()],
+                    "J_history": data["J_history"].tolist(),
+                    "state": {k[len("state_"):]: data[k] for k in data.files if k.startswith("state_")}}
+
+
+def minibatch_gradient_descent(batches, w_in, b_in, cost_gradient_function, alpha, num_epochs,
+                               lambda_=0., verbose=True, early_stopping=None):
+    """
+    Performs mini-batch gradient descent. Each epoch takes one gradient step per batch
+    returned by the batch source, so the data never has to be in memory all at once.
+    Args:
+      batches (function)       : batch source, see array_batches, npy_batches, generator_batches
+      w_in (ndarray (n,))      : Initial values of model parameters
+      b_in (scalar)            : Initial value of model parameter
+      cost_gradient_function   : function returning (cost, dj_db, dj_dw) for a batch, called as
+                                 cost_gradient_function(X_batch, y_batch, w, b, lambda_),
+                                 for example linear_cost_gradient or logistic_cost_gradient
+      alpha (float or function): Learning rate, or a schedule mapping the step number to alpha
+      num_epochs (int)         : number of passes over the data
+      lambda_ (scalar)         : regularization constant
+      verbose (bool)           : print the cost 10 times during training
+      early_stopping           : optional EarlyStopping, checked on the mean cost after
+                                 every epoch (the gradient criterion is not used)
+    Returns:
+      w (ndarray (n,))         : Updated values of parameters
+      b (scalar)               : Updated value of parameter
+      J_history (CostHistory)  : mean batch cost of every epoch and the stop reason
+    """
+    schedule = alpha if callable(alpha) else (lambda step: alpha)
+    w = np.array(w_in, dtype=float)
+    b = float(b_in)
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    step = 0
+    if early_stopping is not None:
+        early_stopping.start()
+
+    for epoch in range(num_epochs):
+        cost_sum = 0.
+        n_seen = 0
+        for X_b, y_b in batches():
+            cost, dj_db, dj_dw = cost_gradient_function(X_b, y_b, w, b, lambda_)
+            a = schedule(step)
+            w -= a * dj_dw
+            b -= a * dj_db
+            cost_sum += cost * X_b.shape[0]
+            n_seen += X_b.shape[0]
+            step += 1
+        J_history.append(cost_sum / n_seen)
+
+        if verbose and (epoch % math.ceil(num_epochs / 10) == 0 or epoch == num_epochs - 1):
+            print(f"Epoch {epoch:4}: Cost {J_history[-1]:8.4f}   ")
+
+        if early_stopping is not None and early_stopping.update(J_history[-1]):
+            J_history.stop_reason = early_stopping.stop_reason
+            if verbose:
+                print(f"Epoch {epoch:4}: Cost {J_history[-1]:8.4f}   stopped ({J_history.stop_reason})")
+            break
+
+    J_history.num_iters = len(J_history)
+    return w, b, J_history
+
+
+# ---------------------------------------------------------------------------
+# Learning rate selection
+# ---------------------------------------------------------------------------
+
+def find_learning_rate(X, y, cost_gradient_function, w_in=None, b_in=0., lambda_=0.,
+                       alpha_min=1e-10, alpha_max=10., num_alphas=23, steps=20, refine=4,
+                       verbose=True):
+    """
+    Learning rate range test. Tries learning rates on a log scale from alpha_min upwards,
+    each for a few gradient steps from the same starting point. A trial is abandoned as soon
+    as the cost rises above its starting value or stops being finite, and the sweep ends at
+    the first learning rate that diverges. The boundary between the largest stable and the
+    smallest diverging rate is then narrowed by `refine` bisections on the log scale.
+    Args:
+      X (ndarray (m,n))      : Data, m examples with n features
+      y (ndarray (m,))       : target values
+      cost_gradient_function : function returning (cost, dj_db, dj_dw)
+      w_in (ndarray (n,))    : starting parameters, zeros if None
+      b_in (scalar)          : starting parameter
+      lambda_ (scalar)       : regularization constant
+      alpha_min, alpha_max   : range of the sweep
+      num_alphas (int)       : number of learning rates in the sweep
+      steps (int)            : gradient steps per trial
+      refine (int)           : number of bisections of the stable/diverging boundary
+      verbose (bool)         : print each trial
+    Returns:
+      alpha (float)   : the largest learning rate found to be stable. A ValueError is
+                        raised if even alpha_min diverges
+      trials (list)   : (alpha, final cost, diverged) for every trial, in the order run
+    """
+    X = cast_data(X)
+    w_in = np.zeros(X.shape[1]) if w_in is None else np.asarray(w_in, dtype=float)
+    trials = []
+
+    def trial(alpha):
+        w, b = w_in.copy(), float(b_in)
+        cost0 = None
+        diverged = False
+        for step in range(steps + 1):
+            cost, dj_db, dj_dw = cost_gradient_function(X, y, w, b, lambda_)
+            if cost0 is None:
+                cost0 = cost
+            elif not np.isfinite(cost) or cost > cost0:
+                diverged = True
+                break
+            if step < steps:
+                w = w - alpha * dj_dw
+                b = b - alpha * dj_db
+        trials.append((alpha, cost, diverged))
+        if verbose:
+            print(f"alpha {alpha:9.2e}: cost {cost:10.4g} {'diverged' if diverged else ''}")
+        return diverged
+
+    stable, unstable = None, None
+    with np.errstate(over='ignore', invalid='ignore'):
+        for alpha in np.logspace(np.log10(alpha_min), np.log10(alpha_max), num_alphas):
+            if trial(alpha):
+                unstable = alpha
+                break
+            stable = alpha
+
+        if stable is None:
+            raise ValueError(f"the cost diverges already at alpha_min={alpha_min:0.2e}, "
+                             "lower alpha_min or scale the features")
+        if unstable is not None:
+            for _ in range(refine):
+                alpha = math.sqrt(stable * unstable)
+                if trial(alpha):
+                    unstable = alpha
+                else:
+                    stable = alpha
+
+    return stable, trials
+
+
+def backtracking_gradient_descent(X, y, w_in, b_in, cost_gradient_function, num_iters, alpha=1.,
+                                  lambda_=0., beta=0.5, c=1e-4, verbose=True):
+    """
+    Gradient descent with a backtracking (Armijo) line search, so no learning rate has to be
+    tuned. Each iteration starts from twice the previous step size and multiplies it by beta
+    until the cost decreases by at least c * alpha * |gradient|^2 (the Armijo condition).
+    Args:
+      X (ndarray (m,n))      : Data, m examples with n features
+      y (ndarray (m,))       : target values
+      w_in (ndarray (n,))    : Initial values of model parameters
+      b_in (scalar)          : Initial value of model parameter
+      cost_gradient_function : function returning (cost, dj_db, dj_dw)
+      num_iters (int)        : number of iterations
+      alpha (float)          : first step size to try
+      lambda_ (scalar)       : regularization constant
+      beta (float)           : factor the step size is reduced by, between 0 and 1
+      c (float)              : fraction of the predicted decrease that must be achieved
+      verbose (bool)         : print the cost 10 times during training
+    Returns:
+      w (ndarray (n,))        : Updated values of parameters
+      b (scalar)              : Updated value of parameter
+      J_history (CostHistory) : cost at every iteration
+      alpha_history (list)    : step size accepted at every iteration
+    """
+    X = cast_data(X)
+    w = np.array(w_in, dtype=float)
+    b = float(b_in)
+    J_history = CostHistory()
+    J_history.stop_reason = "num_iters"
+    alpha_history = []
+
+    cost, dj_db, dj_dw = cost_gradient_function(X, y, w, b, lambda_)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for i in range(num_iters):
+            grad_sq = np.dot(dj_dw, dj_dw) + dj_db ** 2
+            while True:
+                w_new, b_new = w - alpha * dj_dw, b - alpha * dj_db
+                cost_new, db_new, dw_new = cost_gradient_function(X, y, w_new, b_new, lambda_)
+                if cost_new <= cost - c * alpha * grad_sq or alpha < 1e-20:
+                    break
+                alpha *= beta
+            w, b, cost, dj_db, dj_dw = w_new, b_new, cost_new, db_new, dw_new
+            J_history.append(cost)
+            alpha_history.append(alpha)
+            alpha *= 2
+
+            if verbose and (i % math.ceil(num_iters / 10) == 0 or i == num_iters - 1):
+                print(f"Iteration {i:4}: Cost {cost:8.4g}, alpha {alpha_history[-1]:9.2e}   ")
+
+    J_history.num_iters = len(J_history)
+    return w, b, J_history, alpha_history